@@ -0,0 +1,191 @@
+"""
+Memory profiling cho LightRAG benchmark
+
+Hai chế độ đo:
+- rss:         chênh lệch RSS của process trước/sau (rẻ nhưng nhiễu do allocator và GC)
+- tracemalloc: peak allocation của Python theo từng query/phase + top allocation sites
+
+Ngoài ra tách riêng phần bộ nhớ "thường trú" của storages (vector, graph, kv)
+được load khi initialize_storages() khỏi phần cấp phát tạm thời của mỗi query.
+"""
+
+import os
+import gc
+import tracemalloc
+import psutil
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+MEMORY_MODES = ("rss", "tracemalloc")
+
+# Số frame lưu cho mỗi allocation - cần đủ sâu để phân loại theo storage module
+TRACEMALLOC_FRAMES = 25
+
+# Pattern phân loại bộ nhớ thường trú theo loại storage của LightRAG
+STORAGE_PATTERNS = {
+    "vector": ["*nano_vectordb*", "*vector_db_impl*", "*vector_storage*"],
+    "graph": ["*networkx*", "*graph_impl*"],
+    "kv": ["*json_kv_impl*", "*json_doc_status_impl*"],
+}
+
+MB = 1024 * 1024
+
+
+def get_rss_mb() -> float:
+    """Lấy RSS hiện tại của process (MB)"""
+    return psutil.Process(os.getpid()).memory_info().rss / MB
+
+
+@dataclass
+class MemorySample:
+    """Kết quả đo bộ nhớ cho một query hoặc một phase"""
+    label: str
+    mode: str
+    rss_delta_mb: float = 0.0
+    peak_alloc_mb: float = 0.0
+    retained_alloc_mb: float = 0.0
+    top_allocations: list = field(default_factory=list)
+
+    @property
+    def usage_mb(self) -> float:
+        """Giá trị đại diện: peak allocation (tracemalloc) hoặc RSS delta (rss)"""
+        return self.peak_alloc_mb if self.mode == "tracemalloc" else self.rss_delta_mb
+
+
+class MemoryProfiler:
+    """
+    Đo bộ nhớ theo từng query/phase
+
+    Sử dụng:
+        profiler = MemoryProfiler(mode="tracemalloc")
+        profiler.start()
+        with profiler.measure("insert", phase=True) as sample:
+            await rag.ainsert(text)
+        print(sample.peak_alloc_mb)
+        profiler.stop()
+    """
+
+    def __init__(self, mode: str = "rss", top_n: int = 10):
+        if mode not in MEMORY_MODES:
+            raise ValueError(f"Memory mode không hợp lệ: {mode} (chọn một trong {MEMORY_MODES})")
+        self.mode = mode
+        self.top_n = top_n
+        self.phases: list[MemorySample] = []
+        self.storage_resident: dict = {}
+        self._started_tracing = False
+
+    def start(self):
+        if self.mode == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def measure(self, label: str, phase: bool = False):
+        """
+        Context manager đo bộ nhớ của đoạn code bên trong (có thể chứa await)
+
+        phase=True: lưu kết quả vào danh sách phases của báo cáo
+        """
+        sample = MemorySample(label=label, mode=self.mode)
+        gc.collect()
+        rss_before = get_rss_mb()
+
+        if self.mode == "tracemalloc":
+            snapshot_before = tracemalloc.take_snapshot()
+            current_before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+        try:
+            yield sample
+        finally:
+            if self.mode == "tracemalloc":
+                current_after, peak = tracemalloc.get_traced_memory()
+                sample.peak_alloc_mb = round(max(peak - current_before, 0) / MB, 3)
+                sample.retained_alloc_mb = round((current_after - current_before) / MB, 3)
+                snapshot_after = tracemalloc.take_snapshot()
+                sample.top_allocations = self._top_allocations(snapshot_before, snapshot_after)
+
+            sample.rss_delta_mb = round(get_rss_mb() - rss_before, 2)
+
+            if phase:
+                self.phases.append(sample)
+
+    def _top_allocations(self, before, after) -> list[dict]:
+        """Top allocation sites (theo dòng code) tăng nhiều nhất trong khoảng đo"""
+        stats = after.compare_to(before, "lineno")
+        top = []
+        for stat in stats:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            top.append({
+                "location": f"{frame.filename}:{frame.lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count_diff": stat.count_diff,
+            })
+            if len(top) >= self.top_n:
+                break
+        return top
+
+    def record_storage_resident(self, working_dir: str):
+        """
+        Ghi nhận bộ nhớ thường trú của storages sau khi initialize_storages()
+
+        - tracemalloc: tổng allocation còn sống, phân loại theo module storage
+        - Cả hai chế độ: kích thước file trên đĩa theo loại storage
+        """
+        resident = {"rss_mb": round(get_rss_mb(), 2), "on_disk_mb": storage_disk_usage(working_dir)}
+
+        if self.mode == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+            traced = {}
+            for kind, patterns in STORAGE_PATTERNS.items():
+                filters = [tracemalloc.Filter(True, p, all_frames=True) for p in patterns]
+                size = sum(stat.size for stat in snapshot.filter_traces(filters).statistics("filename"))
+                traced[kind] = round(size / MB, 3)
+            resident["traced_mb"] = traced
+
+        self.storage_resident = resident
+        return resident
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "phases": [
+                {
+                    "label": p.label,
+                    "rss_delta_mb": p.rss_delta_mb,
+                    "peak_alloc_mb": p.peak_alloc_mb,
+                    "retained_alloc_mb": p.retained_alloc_mb,
+                    "top_allocations": p.top_allocations,
+                }
+                for p in self.phases
+            ],
+            "storage_resident": self.storage_resident,
+        }
+
+
+def storage_disk_usage(working_dir: str) -> dict:
+    """Kích thước file storage trong working dir (MB) theo loại: vector / graph / kv"""
+    usage = {"vector": 0.0, "graph": 0.0, "kv": 0.0, "other": 0.0}
+    if not os.path.isdir(working_dir):
+        return usage
+
+    for root, _, files in os.walk(working_dir):
+        for name in files:
+            size = os.path.getsize(os.path.join(root, name)) / MB
+            if name.startswith(("vdb_", "mmap_vdb_")):
+                usage["vector"] += size
+            elif name.startswith("graph_"):
+                usage["graph"] += size
+            elif name.startswith("kv_store_"):
+                usage["kv"] += size
+            else:
+                usage["other"] += size
+
+    return {k: round(v, 3) for k, v in usage.items()}
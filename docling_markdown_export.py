@@ -9,6 +9,7 @@ Usage: This module patches the LightRAG document processing to save markdown fil
 import os
 from pathlib import Path
 from typing import Optional
+from timing_spans import span
 
 # Configuration
 MARKDOWN_OUTPUT_DIR = "./docling_markdown"  # Folder to save markdown files
@@ -88,9 +89,10 @@ def patch_docling_processing():
             """Patched version that saves markdown"""
             from docling.document_converter import DocumentConverter
             
-            converter = DocumentConverter()
-            result = converter.convert(file_path)
-            markdown_content = result.document.export_to_markdown()
+            with span("docling_conversion", filename=Path(file_path).name):
+                converter = DocumentConverter()
+                result = converter.convert(file_path)
+                markdown_content = result.document.export_to_markdown()
             
             # Save markdown file
             save_docling_markdown(str(file_path), markdown_content)
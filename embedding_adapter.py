@@ -0,0 +1,162 @@
+"""
+Embedding adapter không block event loop cho LightRAG
+
+SentenceTransformer.encode() là hàm đồng bộ - gọi trực tiếp trong hàm async sẽ chặn
+event loop mà LightRAG dùng chung cho extraction và các LLM call (MAX_ASYNC trở thành
+tuần tự trong lúc encode). Adapter này:
+- chạy encode trên worker thread (torch nhả GIL trong lúc tính toán)
+- gộp các lệnh gọi đồng thời thành batch lớn hơn (tối đa max_batch_size texts)
+- đếm throughput: số lệnh gọi, số batch, texts/sec, thời gian chờ trong hàng đợi
+- (tuỳ chọn) pooling="mean"|"max": tách text dài theo câu thành các cửa sổ vừa với
+  model thay vì để model cắt bỏ phần đuôi, embed một batch rồi pool về một vector
+
+Sử dụng:
+    embedding_adapter = BatchingEmbeddingAdapter(embedding_model)
+
+    @wrap_embedding_func_with_attrs(embedding_dim=768, max_token_size=512, model_name=...)
+    async def embedding_func(texts: list[str]) -> np.ndarray:
+        return await embedding_adapter(texts)
+"""
+
+import time
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from vietnamese_chunking import build_windows, pool_windows, make_token_counter, POOLING_METHODS
+
+
+class BatchingEmbeddingAdapter:
+    """Gộp các lệnh gọi embedding đồng thời và encode trên worker thread"""
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        encode_batch_size: int = 32,
+        normalize_embeddings: bool = True,
+        executor: ThreadPoolExecutor | None = None,
+        pooling: str | None = None,
+        window_tokens: int = 200,
+    ):
+        # Kiểm tra một lần khi khởi tạo (không phải mỗi lệnh gọi embedding)
+        if pooling is not None and pooling not in POOLING_METHODS:
+            raise ValueError(f"Pooling không hợp lệ: {pooling} (chọn none hoặc một trong {POOLING_METHODS})")
+        if window_tokens <= 0:
+            raise ValueError(f"window_tokens phải > 0: {window_tokens}")
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.encode_batch_size = encode_batch_size
+        self.normalize_embeddings = normalize_embeddings
+        self.pooling = pooling
+        self.window_tokens = window_tokens
+        self._count_tokens = make_token_counter(model.tokenizer) if pooling else None
+        # Một worker: GPU/CPU encode tuần tự, song song hoá nằm ở việc gộp batch
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._pending: list[tuple[list[str], asyncio.Future, float]] = []
+        self._pending_texts = 0
+        self._worker: asyncio.Task | None = None
+        self.stats = {
+            "calls": 0,
+            "texts": 0,
+            "windows": 0,
+            "batches": 0,
+            "max_batch_texts": 0,
+            "encode_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+        }
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encode đồng bộ (chạy trên worker thread)"""
+        if self.pooling:
+            windows, owners = build_windows(texts, self._count_tokens, self.window_tokens)
+        else:
+            windows, owners = texts, None
+        self.stats["windows"] += len(windows)
+
+        embeddings = self.model.encode(
+            windows,
+            batch_size=self.encode_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings,
+            show_progress_bar=False,
+        )
+        if owners is None:
+            return embeddings
+        return pool_windows(embeddings, owners, len(texts), self.pooling)
+
+    async def __call__(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(texts), future, time.perf_counter()))
+        self._pending_texts += len(texts)
+        self.stats["calls"] += 1
+
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+        return await future
+
+    def _take_batch(self) -> list[tuple[list[str], asyncio.Future, float]]:
+        """Lấy các request đầu hàng đợi cho đến khi đủ max_batch_size texts"""
+        batch, size = [], 0
+        while self._pending:
+            texts = self._pending[0][0]
+            if batch and size + len(texts) > self.max_batch_size:
+                break
+            batch.append(self._pending.pop(0))
+            size += len(texts)
+        self._pending_texts -= size
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            # Chờ ngắn để các lệnh gọi đồng thời kịp vào cùng batch
+            if self._pending_texts < self.max_batch_size and self.max_wait_s > 0:
+                await asyncio.sleep(self.max_wait_s)
+
+            batch = [item for item in self._take_batch() if not item[1].cancelled()]
+            if not batch:
+                continue
+            texts = [t for item in batch for t in item[0]]
+
+            start = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.stats["queue_wait_seconds"] += start - enqueued_at
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self.encode, texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats["encode_seconds"] += time.perf_counter() - start
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+            self.stats["max_batch_texts"] = max(self.stats["max_batch_texts"], len(texts))
+
+            offset = 0
+            for item_texts, future, _ in batch:
+                if not future.done():
+                    future.set_result(embeddings[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def report(self) -> dict:
+        """Throughput counters"""
+        stats = self.stats
+        return {
+            **stats,
+            "encode_seconds": round(stats["encode_seconds"], 4),
+            "queue_wait_seconds": round(stats["queue_wait_seconds"], 4),
+            "avg_batch_texts": round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0,
+            "texts_per_sec": round(stats["texts"] / stats["encode_seconds"], 2) if stats["encode_seconds"] else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,194 @@
+"""
+Autotune batch size cho Vietnamese Embedding Service
+
+Quét các batch size theo từng nhóm độ dài chuỗi (sequence-length bucket) trên phần cứng
+thực tế, đo texts/sec và bộ nhớ, chọn batch size nhanh nhất dưới trần bộ nhớ.
+Trên CPU không đo bộ nhớ (RSS delta phụ thuộc allocator, không phải peak): batch size
+chỉ được chọn theo throughput.
+Kết quả được lưu theo thiết bị (tên GPU / CPU) để lần khởi động sau dùng lại.
+
+Sử dụng:
+    result = autotune(model, device)
+    save_result(result)
+    batch_sizes = load_batch_sizes(device_key(device))   # {bucket_tokens: batch_size}
+"""
+
+import os
+import gc
+import json
+import time
+import platform
+import torch
+from datetime import datetime
+
+AUTOTUNE_FILE = "./config/embedding_autotune.json"
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64, 128)
+DEFAULT_SEQ_BUCKETS = (32, 64, 128, 200)
+
+# Batch size nhỏ hơn được ưu tiên nếu chậm hơn batch tốt nhất không quá 5%
+THROUGHPUT_TOLERANCE = 0.05
+
+SAMPLE_SENTENCE = (
+    "Hà Nội là thủ đô của Việt Nam với lịch sử hơn một nghìn năm và nhiều di tích như "
+    "Văn Miếu, Hoàng Thành Thăng Long, Hồ Gươm. "
+)
+
+MB = 1024 * 1024
+
+
+def _on_cuda(device: str) -> bool:
+    return device.startswith("cuda") and torch.cuda.is_available()
+
+
+def device_key(device: str) -> str:
+    """Khoá định danh thiết bị để lưu kết quả autotune"""
+    if _on_cuda(device):
+        props = torch.cuda.get_device_properties(torch.device(device))
+        return f"cuda:{props.name}:{props.total_memory // MB}MB"
+    return f"cpu:{platform.processor() or platform.machine()}:{os.cpu_count()}cores"
+
+
+def default_memory_ceiling_mb(device: str) -> float | None:
+    """80% bộ nhớ GPU (None khi chạy CPU - không đo bộ nhớ)"""
+    if _on_cuda(device):
+        return torch.cuda.get_device_properties(torch.device(device)).total_memory / MB * 0.8
+    return None
+
+
+def _sample_text(tokenizer, tokens: int) -> str:
+    """Text tiếng Việt dài đúng khoảng `tokens` tokens"""
+    ids = tokenizer.encode(SAMPLE_SENTENCE * (tokens // 8 + 1), add_special_tokens=False)[:tokens]
+    return tokenizer.decode(ids, skip_special_tokens=True)
+
+
+def _measure(model, device: str, texts: list[str], batch_size: int, repeats: int) -> dict:
+    """Đo texts/sec và bộ nhớ peak (chỉ CUDA, CPU: memory_mb=None) cho một batch size"""
+    gc.collect()
+    on_cuda = _on_cuda(device)
+    if on_cuda:
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats()
+        memory_before = torch.cuda.memory_allocated()
+
+    # Warm-up một batch
+    model.encode(texts[:batch_size], batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    if on_cuda:
+        torch.cuda.synchronize()
+    elapsed = time.perf_counter() - start
+
+    memory_mb = None
+    if on_cuda:
+        memory_mb = round((torch.cuda.max_memory_allocated() - memory_before) / MB, 1)
+
+    return {
+        "batch_size": batch_size,
+        "texts_per_sec": round(len(texts) * repeats / elapsed, 2),
+        "memory_mb": memory_mb,
+    }
+
+
+def _within_ceiling(point: dict, memory_ceiling_mb: float | None) -> bool:
+    if memory_ceiling_mb is None or point["memory_mb"] is None:
+        return True
+    return point["memory_mb"] <= memory_ceiling_mb
+
+
+def _pick_best(curve: list[dict], memory_ceiling_mb: float | None) -> int | None:
+    """Batch size nhỏ nhất có throughput trong THROUGHPUT_TOLERANCE so với tốt nhất"""
+    candidates = [p for p in curve if not p.get("oom") and _within_ceiling(p, memory_ceiling_mb)]
+    if not candidates:
+        return None
+    best = max(p["texts_per_sec"] for p in candidates)
+    return min(p["batch_size"] for p in candidates if p["texts_per_sec"] >= best * (1 - THROUGHPUT_TOLERANCE))
+
+
+def autotune(
+    model,
+    device: str,
+    batch_sizes=DEFAULT_BATCH_SIZES,
+    seq_buckets=DEFAULT_SEQ_BUCKETS,
+    memory_ceiling_mb: float | None = None,
+    repeats: int = 3,
+) -> dict:
+    """
+    Quét batch size x sequence-length bucket
+
+    Returns:
+        {"device": ..., "batch_sizes": {bucket: best_batch_size}, "curves": {bucket: [...]}, ...}
+    """
+    if memory_ceiling_mb is None:
+        memory_ceiling_mb = default_memory_ceiling_mb(device)
+    if not _on_cuda(device):
+        print("  [autotune] CPU: memory not measured, batch size chosen by throughput only")
+
+    curves, best = {}, {}
+    for bucket in seq_buckets:
+        text = _sample_text(model.tokenizer, bucket)
+        texts = [text] * max(max(batch_sizes), 32)
+        curve = []
+        for batch_size in batch_sizes:
+            try:
+                point = _measure(model, device, texts, batch_size, repeats)
+            except (torch.cuda.OutOfMemoryError, RuntimeError) as e:
+                if "out of memory" not in str(e).lower():
+                    raise
+                torch.cuda.empty_cache()
+                curve.append({"batch_size": batch_size, "oom": True})
+                break
+            curve.append(point)
+            memory = f"{point['memory_mb']:>8.1f} MB" if point["memory_mb"] is not None else "     n/a"
+            print(f"  [autotune] seq={bucket:<4} batch={batch_size:<4} "
+                  f"{point['texts_per_sec']:>9.1f} texts/s  {memory}")
+            if not _within_ceiling(point, memory_ceiling_mb):
+                break
+
+        curves[str(bucket)] = curve
+        chosen = _pick_best(curve, memory_ceiling_mb)
+        if chosen is not None:
+            best[str(bucket)] = chosen
+
+    return {
+        "device": device_key(device),
+        "memory_ceiling_mb": round(memory_ceiling_mb, 1) if memory_ceiling_mb is not None else None,
+        "memory_measured": _on_cuda(device),
+        "batch_sizes": best,
+        "curves": curves,
+        "tuned_at": datetime.now().isoformat(),
+    }
+
+
+def _load_all(path: str = AUTOTUNE_FILE) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_result(result: dict, path: str = AUTOTUNE_FILE):
+    """Lưu kết quả autotune theo thiết bị (giữ kết quả của các thiết bị khác)"""
+    data = _load_all(path)
+    data[result["device"]] = result
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load_batch_sizes(key: str, path: str = AUTOTUNE_FILE) -> dict[int, int]:
+    """Batch size đã tune cho thiết bị: {bucket_tokens: batch_size} (rỗng nếu chưa tune)"""
+    result = _load_all(path).get(key, {})
+    return {int(bucket): size for bucket, size in result.get("batch_sizes", {}).items()}
+
+
+def batch_size_for(batch_sizes: dict[int, int], tokens: int, default: int = 8) -> int:
+    """Batch size cho text dài `tokens` tokens - dùng bucket nhỏ nhất chứa được text"""
+    if not batch_sizes:
+        return default
+    for bucket in sorted(batch_sizes):
+        if tokens <= bucket:
+            return batch_sizes[bucket]
+    return batch_sizes[max(batch_sizes)]
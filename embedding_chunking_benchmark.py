@@ -0,0 +1,202 @@
+"""
+Embedding Chunking Benchmark - truncate vs pooling theo cửa sổ câu
+
+So sánh 3 cách embed chunk dài hơn cửa sổ của model:
+- truncate: cắt chunk ở window_tokens (như vietnamese_embedding_service mặc định)
+- mean:     tách câu thành các cửa sổ, embed một batch, mean pooling
+- max:      như trên, max pooling
+
+Metrics:
+- Recall@k: mỗi câu trong chunk được dùng làm query, kỳ vọng tìm lại đúng chunk chứa nó.
+  Tách riêng câu ở đầu chunk (nằm trong cửa sổ đầu) và câu ở đuôi (bị truncate bỏ).
+- Throughput: chunks/sec và số cửa sổ phải encode
+
+Dữ liệu: các file .txt/.md trong ./inputs (hoặc --inputs-dir), chunk theo CHUNK_SIZE tokens.
+
+Chạy:
+    python embedding_chunking_benchmark.py
+    python embedding_chunking_benchmark.py --inputs-dir ./docling_markdown --chunk-tokens 1200 --top-k 5
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from sentence_transformers import SentenceTransformer
+from vietnamese_chunking import (
+    split_sentences, split_into_windows, build_windows, pool_windows, make_token_counter,
+)
+
+EMBEDDING_MODEL_NAME = "dangvantuan/vietnamese-embedding"
+BENCHMARK_RESULTS_DIR = "./benchmark_results"
+
+SAMPLE_TEXTS = [
+    """Hà Nội là thủ đô của Việt Nam, nằm ở phía Bắc của đất nước.
+    Thành phố có lịch sử hơn 1000 năm với nhiều di tích lịch sử như Văn Miếu,
+    Hoàng Thành Thăng Long và Hồ Gươm.""",
+    """TP. Hồ Chí Minh là thành phố lớn nhất Việt Nam, nằm ở phía Nam.
+    Đây là trung tâm kinh tế và tài chính của cả nước với nhiều tòa nhà cao tầng
+    và khu công nghiệp.""",
+    """Công ty VNG là một trong những công ty công nghệ hàng đầu Việt Nam,
+    được thành lập năm 2004. Công ty nổi tiếng với sản phẩm Zalo -
+    ứng dụng nhắn tin phổ biến nhất tại Việt Nam.""",
+    """FPT là tập đoàn công nghệ lớn nhất Việt Nam, hoạt động trong lĩnh vực
+    phần mềm, viễn thông và giáo dục. FPT Software là công ty con chuyên về
+    outsourcing phần mềm.""",
+    """Ngành trí tuệ nhân tạo (AI) đang phát triển rất nhanh tại Việt Nam.
+    Nhiều startup công nghệ đang ứng dụng AI vào các lĩnh vực như y tế,
+    giáo dục và tài chính.""",
+]
+
+
+def load_documents(inputs_dir: str) -> list[str]:
+    """Đọc các file text/markdown trong inputs_dir (fallback: dữ liệu mẫu)"""
+    docs = []
+    if os.path.isdir(inputs_dir):
+        for path in sorted(Path(inputs_dir).rglob("*")):
+            if path.suffix.lower() in (".txt", ".md") and path.is_file():
+                text = path.read_text(encoding="utf-8", errors="ignore").strip()
+                if text:
+                    docs.append(text)
+    if not docs:
+        print(f"⚠️  Không có file .txt/.md trong {inputs_dir} - dùng dữ liệu mẫu "
+              f"(chunk ngắn, các chế độ sẽ cho kết quả gần như nhau)")
+        docs = SAMPLE_TEXTS
+    return docs
+
+
+def build_queries(chunks: list[str], count_tokens, window_tokens: int, max_queries: int):
+    """
+    Mỗi câu của chunk là một query; đánh dấu "head" nếu câu nằm trọn trong
+    window_tokens tokens đầu của chunk, ngược lại là "tail"
+    """
+    queries = []
+    for chunk_index, chunk in enumerate(chunks):
+        offset = 0
+        for sentence in split_sentences(chunk):
+            tokens = count_tokens(sentence)
+            position = "head" if offset + tokens <= window_tokens else "tail"
+            offset += tokens
+            if tokens >= 5:
+                queries.append((sentence, chunk_index, position))
+
+    if len(queries) > max_queries:
+        rng = np.random.default_rng(0)
+        keep = sorted(rng.choice(len(queries), size=max_queries, replace=False))
+        queries = [queries[i] for i in keep]
+    return queries
+
+
+def embed_chunks(model, chunks: list[str], mode: str, count_tokens, window_tokens: int, batch_size: int):
+    """Embed chunks theo chế độ truncate / mean / max - trả về (vectors, số cửa sổ)"""
+    if mode == "truncate":
+        windows = [
+            model.tokenizer.decode(
+                model.tokenizer.encode(c, add_special_tokens=False)[:window_tokens],
+                skip_special_tokens=True,
+            )
+            for c in chunks
+        ]
+        owners = None
+    else:
+        windows, owners = build_windows(chunks, count_tokens, window_tokens)
+
+    vectors = model.encode(
+        windows, batch_size=batch_size, convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=False,
+    )
+    if owners is not None:
+        vectors = pool_windows(vectors, owners, len(chunks), mode)
+    return vectors, len(windows)
+
+
+def recall_at_k(similarities: np.ndarray, targets: np.ndarray, k: int) -> float:
+    if len(targets) == 0:
+        return 0.0
+    k = min(k, similarities.shape[1])
+    top_k = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    return float(np.mean([target in row for row, target in zip(top_k, targets)]))
+
+
+def run(args):
+    print("\n" + "="*100)
+    print("🧩 Embedding Chunking Benchmark - truncate vs pooling")
+    print("="*100)
+
+    print(f"Đang tải model embedding: {EMBEDDING_MODEL_NAME}...")
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    count_tokens = make_token_counter(model.tokenizer)
+
+    docs = load_documents(args.inputs_dir)
+    chunks = [c for doc in docs for c in split_into_windows(doc, count_tokens, args.chunk_tokens)]
+    queries = build_queries(chunks, count_tokens, args.window_tokens, args.max_queries)
+    token_counts = [count_tokens(c) for c in chunks]
+
+    print(f"Documents: {len(docs)} | Chunks: {len(chunks)} | Queries: {len(queries)}")
+    print(f"Chunk tokens: avg {np.mean(token_counts):.0f}, max {max(token_counts)} "
+          f"| Window tokens: {args.window_tokens}")
+
+    query_vectors = model.encode(
+        [q[0] for q in queries], batch_size=args.batch_size, convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=False,
+    )
+    targets = np.array([q[1] for q in queries])
+    positions = np.array([q[2] for q in queries])
+
+    results = {}
+    for mode in ("truncate", "mean", "max"):
+        start = time.perf_counter()
+        chunk_vectors, window_count = embed_chunks(
+            model, chunks, mode, count_tokens, args.window_tokens, args.batch_size,
+        )
+        elapsed = time.perf_counter() - start
+
+        similarities = query_vectors @ chunk_vectors.T
+        results[mode] = {
+            "recall_at_k": round(recall_at_k(similarities, targets, args.top_k), 4),
+            "recall_head": round(recall_at_k(similarities[positions == "head"], targets[positions == "head"], args.top_k), 4),
+            "recall_tail": round(recall_at_k(similarities[positions == "tail"], targets[positions == "tail"], args.top_k), 4),
+            "windows": window_count,
+            "embed_seconds": round(elapsed, 3),
+            "chunks_per_sec": round(len(chunks) / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    print(f"\n{'Mode':<10} {f'Recall@{args.top_k}':<12} {'Head':<10} {'Tail':<10} {'Windows':<10} {'Time(s)':<10} {'Chunks/sec':<12}")
+    print("-"*100)
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['recall_at_k']:<12.3f} {r['recall_head']:<10.3f} {r['recall_tail']:<10.3f} "
+              f"{r['windows']:<10} {r['embed_seconds']:<10.3f} {r['chunks_per_sec']:<12.2f}")
+
+    os.makedirs(BENCHMARK_RESULTS_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_file = os.path.join(BENCHMARK_RESULTS_DIR, f"embedding_chunking_{timestamp}.json")
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "config": vars(args),
+            "chunks": len(chunks),
+            "queries": len(queries),
+            "tail_queries": int(np.sum(positions == "tail")),
+            "results": results,
+            "generated_at": datetime.now().isoformat(),
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embedding chunking benchmark")
+    parser.add_argument("--inputs-dir", default="./inputs", help="Thư mục chứa file .txt/.md")
+    parser.add_argument("--chunk-tokens", type=int, default=int(os.getenv("CHUNK_SIZE", "1200")),
+                        help="Kích thước chunk (tokens của embedding model), mặc định CHUNK_SIZE")
+    parser.add_argument("--window-tokens", type=int, default=200, help="Kích thước cửa sổ embed (tokens)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,203 @@
+"""
+Scheduler hai lớp ưu tiên cho Vietnamese Embedding Service
+
+- interactive: embedding cho câu hỏi của người dùng (ít text, cần latency thấp)
+- bulk:        embedding chunk khi ingestion (nhiều text, chịu được chờ)
+
+Request bulk được chia thành các work unit nhỏ; worker encode từng unit nên một request
+interactive mới đến chỉ phải chờ unit đang chạy (preempt tại ranh giới batch).
+Chống starvation: sau `starvation_limit` batch interactive liên tiếp, hoặc khi bulk chưa
+được phục vụ trong `max_bulk_wait_s` (tính từ batch bulk gần nhất, không phải tuổi của
+backlog), worker phục vụ một unit bulk rồi interactive lại được ưu tiên.
+
+Sử dụng:
+    scheduler = EmbeddingScheduler(embed_texts)      # embed_texts: list[str] -> np.ndarray
+    vectors = await scheduler.submit(texts, "interactive")
+
+on_batch(priority, text_count, encode_seconds): callback tuỳ chọn sau mỗi batch (metrics)
+
+run_exclusive(fn, ...): chạy fn trên chính worker thread (vd: autotune) - batch đang
+encode chạy xong trước, các batch mới chờ tới khi fn kết thúc
+"""
+
+import time
+import asyncio
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+PRIORITY_CLASSES = ("interactive", "bulk")
+
+# Số mẫu latency giữ lại cho mỗi lớp để tính percentile
+LATENCY_WINDOW = 1000
+
+
+@dataclass
+class _WorkUnit:
+    texts: list[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class _ClassMetrics:
+    """Metrics cho một lớp ưu tiên"""
+
+    def __init__(self):
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.queue_wait_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def report(self) -> dict:
+        latencies = np.asarray(self.latencies, dtype=float) * 1000
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "queue_wait_seconds": round(self.queue_wait_seconds, 4),
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2) if latencies.size else 0.0,
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2) if latencies.size else 0.0,
+            "latency_max_ms": round(float(latencies.max()), 2) if latencies.size else 0.0,
+        }
+
+
+class EmbeddingScheduler:
+    """Hàng đợi ưu tiên interactive > bulk, encode tuần tự trên một worker thread"""
+
+    def __init__(
+        self,
+        embed_fn,
+        unit_texts: int = 16,
+        max_interactive_texts: int = 32,
+        starvation_limit: int = 4,
+        max_bulk_wait_s: float = 2.0,
+        on_batch=None,
+    ):
+        self.embed_fn = embed_fn
+        self.on_batch = on_batch
+        self.unit_texts = unit_texts
+        self.max_interactive_texts = max_interactive_texts
+        self.starvation_limit = starvation_limit
+        self.max_bulk_wait_s = max_bulk_wait_s
+        self._queues: dict[str, deque[_WorkUnit]] = {c: deque() for c in PRIORITY_CLASSES}
+        self._metrics = {c: _ClassMetrics() for c in PRIORITY_CLASSES}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-worker")
+        self._wakeup: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+        self._interactive_streak = 0
+        self._last_bulk_served = 0.0
+        self.starvation_promotions = 0
+        self.exclusive_running = False
+
+    def queue_depth(self, priority: str | None = None) -> int:
+        """Số text đang chờ (theo lớp hoặc tổng)"""
+        classes = [priority] if priority else PRIORITY_CLASSES
+        return sum(len(u.texts) for c in classes for u in self._queues[c])
+
+    async def submit(self, texts: list[str], priority: str = "bulk") -> np.ndarray:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Priority không hợp lệ: {priority} (chọn một trong {PRIORITY_CLASSES})")
+
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+        start = time.perf_counter()
+        size = len(texts) if priority == "interactive" else self.unit_texts
+        units = [
+            _WorkUnit(texts[i:i + size], loop.create_future())
+            for i in range(0, len(texts), size)
+        ]
+        self._queues[priority].extend(units)
+        self._wakeup.set()
+
+        metrics = self._metrics[priority]
+        metrics.requests += 1
+        metrics.texts += len(texts)
+
+        results = await asyncio.gather(*(u.future for u in units))
+        metrics.latencies.append(time.perf_counter() - start)
+        return np.concatenate(results) if len(results) > 1 else results[0]
+
+    async def run_exclusive(self, fn, *args):
+        """Chạy fn(*args) trên worker thread, không chồng lên batch encode nào"""
+        loop = asyncio.get_running_loop()
+        self.exclusive_running = True
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.exclusive_running = False
+
+    def _bulk_starving(self) -> bool:
+        bulk = self._queues["bulk"]
+        if not bulk:
+            return False
+        # Các unit của một request bulk lớn có chung enqueued_at: đo từ lần phục vụ bulk
+        # gần nhất, nếu không backlog cũ sẽ "đói" mãi và chặn interactive tới khi hết
+        waited = time.perf_counter() - max(bulk[0].enqueued_at, self._last_bulk_served)
+        return self._interactive_streak >= self.starvation_limit or waited >= self.max_bulk_wait_s
+
+    def _next_batch(self) -> tuple[str, list[_WorkUnit]]:
+        """Chọn batch tiếp theo: interactive trước (gộp nhiều request nhỏ), trừ khi bulk bị đói"""
+        interactive = self._queues["interactive"]
+        if interactive and not self._bulk_starving():
+            self._interactive_streak += 1
+            batch, size = [], 0
+            while interactive and (not batch or size + len(interactive[0].texts) <= self.max_interactive_texts):
+                unit = interactive.popleft()
+                batch.append(unit)
+                size += len(unit.texts)
+            return "interactive", batch
+
+        if interactive:
+            self.starvation_promotions += 1
+        self._interactive_streak = 0
+        self._last_bulk_served = time.perf_counter()
+        return "bulk", [self._queues["bulk"].popleft()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not any(self._queues.values()):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, batch = self._next_batch()
+            batch = [u for u in batch if not u.future.done()]
+            if not batch:
+                continue
+
+            metrics = self._metrics[priority]
+            started = time.perf_counter()
+            for unit in batch:
+                metrics.queue_wait_seconds += started - unit.enqueued_at
+
+            texts = [t for u in batch for t in u.texts]
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self.embed_fn, texts)
+            except Exception as e:
+                for unit in batch:
+                    if not unit.future.done():
+                        unit.future.set_exception(e)
+                continue
+
+            metrics.batches += 1
+            if self.on_batch is not None:
+                self.on_batch(priority, len(texts), time.perf_counter() - started)
+            offset = 0
+            for unit in batch:
+                if not unit.future.done():
+                    unit.future.set_result(embeddings[offset:offset + len(unit.texts)])
+                offset += len(unit.texts)
+
+    def report(self) -> dict:
+        return {
+            "classes": {c: self._metrics[c].report() for c in PRIORITY_CLASSES},
+            "queue_depth": {c: self.queue_depth(c) for c in PRIORITY_CLASSES},
+            "starvation_promotions": self.starvation_promotions,
+            "exclusive_running": self.exclusive_running,
+        }
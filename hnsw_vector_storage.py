@@ -0,0 +1,279 @@
+"""
+Vector storage ANN (HNSW) cho LightRAG - HnswVectorStorage
+
+Query naive / local / global / hybrid tìm TOP_K / CHUNK_TOP_K vector gần nhất; với
+NanoVectorDBStorage / MmapVectorStorage đó là brute force, tỉ lệ tuyến tính theo corpus.
+HnswVectorStorage giữ nguyên layout file của MmapVectorStorage (memmap + bảng ID +
+metadata) và thêm một chỉ mục hnswlib (cosine, label = số dòng trong memmap):
+
+- upsert: add_items cho các dòng mới (không build lại); upsert / delete: mark_deleted dòng cũ
+- index_done_callback: commit memmap như MmapVectorStorage, rồi lưu
+  mmap_vdb_<namespace>.<gen>.hnsw (chỉ khi index thay đổi)
+- khởi động / nạp lại: load index đã lưu, add các dòng được commit sau lần lưu cuối; nếu
+  chưa có index (vd: chuyển từ MmapVectorStorage) thì build từ memmap một lần
+- compaction đổi số dòng -> build lại index cho generation mới
+- việc load / build index chạy trong thread nền (không chặn event loop); trong lúc chờ,
+  query dùng tìm chính xác trên memmap, index được nhận khi query / commit kế tiếp
+- hnswlib giữ bản sao vector trong RAM (khác MmapVectorStorage)
+
+Cấu hình (environment hoặc vector_db_storage_cls_kwargs hnsw_m / hnsw_ef_construction / hnsw_ef_search):
+    VECTOR_STORAGE=HnswVectorStorage
+    HNSW_M=16                 số cạnh mỗi node (recall / bộ nhớ)
+    HNSW_EF_CONSTRUCTION=200  độ rộng tìm kiếm khi build (recall / thời gian insert)
+    HNSW_EF_SEARCH=64         độ rộng tìm kiếm khi query (recall / latency), luôn >= top_k
+
+Cài đặt: pip install hnswlib
+
+measure_recall(storage, queries, top_k): recall@k và latency so với tìm chính xác
+(dùng trong lightrag_vietnamese_benchmark.py khi --vector-storage HnswVectorStorage)
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+from dataclasses import dataclass
+
+from lightrag.utils import logger
+from mmap_vector_storage import MmapVectorStorage, QUERY_BLOCK_ROWS
+
+try:
+    import hnswlib
+except ImportError as e:
+    raise ImportError(
+        "HnswVectorStorage cần hnswlib: pip install hnswlib "
+        "(hoặc dùng VECTOR_STORAGE=MmapVectorStorage / NanoVectorDBStorage)"
+    ) from e
+
+DEFAULT_EF_VALUES = (16, 32, 64, 128, 256)
+
+
+@dataclass
+class HnswVectorStorage(MmapVectorStorage):
+    def __post_init__(self):
+        kwargs = self.global_config.get("vector_db_storage_cls_kwargs", {})
+        self.hnsw_m = int(kwargs.get("hnsw_m") or os.getenv("HNSW_M", "16"))
+        self.ef_construction = int(kwargs.get("hnsw_ef_construction") or os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+        self.ef_search = int(kwargs.get("hnsw_ef_search") or os.getenv("HNSW_EF_SEARCH", "64"))
+        self._index = None
+        self._index_dirty = False
+        self._index_job = None
+        super().__post_init__()
+
+    # ---------- index lifecycle ----------
+
+    def _index_paths(self) -> tuple[str, str]:
+        prefix = f"{self._base_path}.{self._generation}"
+        return prefix + ".hnsw", prefix + ".hnsw.json"
+
+    def _new_index(self, capacity: int):
+        index = hnswlib.Index(space="ip", dim=self._dim)
+        index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.hnsw_m)
+        return index
+
+    def _load(self):
+        self._index = None
+        super()._load()
+        self._open_index()
+
+    def _open_index(self):
+        """Load / build index trong thread nền - _search dùng tìm chính xác tới khi xong"""
+        index_path, info_path = self._index_paths()
+        job = {
+            "vectors": self._vectors, "rows": self._rows, "capacity": max(len(self._vectors), 1),
+            "index_path": index_path, "info_path": info_path,
+            "save": os.path.exists(self._header_file), "index": None, "error": None,
+        }
+        job["thread"] = threading.Thread(
+            target=self._build_index, args=(job,), name=f"hnsw-{self.namespace}", daemon=True,
+        )
+        self._index_job = job
+        job["thread"].start()
+
+    def _build_index(self, job: dict):
+        """Chạy trong thread nền: chỉ đọc các dòng [0, job["rows"]) (append-only, không đổi nữa)"""
+        try:
+            index, covered = None, 0
+            if os.path.exists(job["index_path"]) and os.path.exists(job["info_path"]):
+                with open(job["info_path"], "r", encoding="utf-8") as f:
+                    info = json.load(f)
+                if info.get("M") == self.hnsw_m and info["rows"] <= job["rows"]:
+                    index = hnswlib.Index(space="ip", dim=self._dim)
+                    index.load_index(job["index_path"], max_elements=max(job["rows"], info["rows"], 1),
+                                     allow_replace_deleted=False)
+                    covered = info["rows"]
+                else:
+                    logger.info(f"[{self.workspace}] HNSW index for {self.namespace} is stale, rebuilding")
+            if index is None:
+                index = self._new_index(max(job["capacity"], job["rows"], 1))
+            if job["rows"] > index.get_max_elements():
+                index.resize_index(job["rows"])
+            for block_start in range(covered, job["rows"], QUERY_BLOCK_ROWS):
+                block_end = min(block_start + QUERY_BLOCK_ROWS, job["rows"])
+                vectors = np.asarray(job["vectors"][block_start:block_end], dtype=np.float32)
+                index.add_items(vectors, np.arange(block_start, block_end))
+            if job["rows"] > covered:
+                logger.info(f"[{self.workspace}] HNSW index for {self.namespace}: added {job['rows'] - covered} rows")
+                if job["save"]:
+                    self._write_index(index, job["rows"], job["index_path"], job["info_path"])
+            job["index"] = index
+        except Exception as e:
+            job["error"] = e
+
+    def _adopt_index(self, wait: bool = False):
+        """Nhận index từ thread nền (nếu đã xong) và bổ sung các thay đổi trong lúc build"""
+        job = self._index_job
+        if job is None or (not wait and job["thread"].is_alive()):
+            return
+        job["thread"].join()
+        self._index_job = None
+        if job["error"] is not None:
+            logger.error(
+                f"[{self.workspace}] Failed to open HNSW index for {self.namespace}, "
+                f"using exact search: {job['error']}"
+            )
+            return
+        self._index = job["index"]
+        self._index_dirty = False
+        # Dòng append trong lúc build, dòng bị xoá / thay thế sau lần lưu index cuối
+        self._add_rows(job["rows"], self._rows)
+        for row in np.flatnonzero(~self._alive[:job["rows"]]):
+            self._mark_deleted(int(row))
+
+    def _add_rows(self, start: int, end: int):
+        """Thêm các dòng [start, end) của memmap vào index (dòng đã xoá vẫn thêm rồi mark_deleted)"""
+        # Chưa có index (đang build trong nền / đang import vdb_*.json) - _adopt_index sẽ thêm sau
+        if self._index is None or end <= start:
+            return
+        if end > self._index.get_max_elements():
+            self._index.resize_index(max(self._index.get_max_elements() * 2, end))
+        for block_start in range(start, end, QUERY_BLOCK_ROWS):
+            block_end = min(block_start + QUERY_BLOCK_ROWS, end)
+            vectors = np.asarray(self._vectors[block_start:block_end], dtype=np.float32)
+            self._index.add_items(vectors, np.arange(block_start, block_end))
+        for row in np.flatnonzero(~self._alive[start:end]):
+            self._mark_deleted(start + int(row))
+        self._index_dirty = True
+
+    def _mark_deleted(self, row: int):
+        if self._index is None:
+            return
+        try:
+            self._index.mark_deleted(row)
+            self._index_dirty = True
+        except RuntimeError:
+            # Dòng chưa có trong index hoặc đã được đánh dấu xoá
+            pass
+
+    def _save_index(self):
+        self._write_index(self._index, self._rows, *self._index_paths())
+        self._index_dirty = False
+
+    def _write_index(self, index, rows: int, index_path: str, info_path: str):
+        index.save_index(index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        with open(info_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "rows": rows, "M": self.hnsw_m, "ef_construction": self.ef_construction,
+            }, f)
+        os.replace(info_path + ".tmp", info_path)
+
+    def _close(self):
+        super()._close()
+        # Thread build đang chạy (nếu có) giữ memmap riêng, kết quả bị bỏ
+        self._index = None
+        self._index_job = None
+
+    # ---------- hooks của MmapVectorStorage ----------
+
+    def _set_row(self, id_: str, row: int, offset: int, length: int):
+        old_row = self._row_of.get(id_)
+        super()._set_row(id_, row, offset, length)
+        if old_row is not None:
+            self._mark_deleted(old_row)
+
+    def _unset(self, id_: str) -> bool:
+        row = self._row_of.get(id_)
+        removed = super()._unset(id_)
+        if removed:
+            self._mark_deleted(row)
+        return removed
+
+    def _append(self, metas: dict[str, dict], vectors: np.ndarray):
+        start = self._rows
+        super()._append(metas, vectors)
+        self._add_rows(start, self._rows)
+
+    def _commit(self):
+        self._adopt_index()
+        super()._commit()
+        if self._index is not None and self._index_dirty:
+            self._save_index()
+
+    def _search(self, embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k theo HNSW; tìm chính xác khi index chưa sẵn sàng hoặc không trả đủ k kết quả"""
+        self._adopt_index()
+        if self._index is None:
+            return super()._search(embedding, k)
+        self._index.set_ef(max(self.ef_search, k))
+        try:
+            labels, distances = self._index.knn_query(embedding, k=k)
+        except RuntimeError:
+            # Quá nhiều dòng đã xoá so với ef - hiếm, trả kết quả chính xác
+            return super()._search(embedding, k)
+        # space="ip": distance = 1 - inner product
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+    def exact_search(self, embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Tìm chính xác (brute force trên memmap) - dùng để đo recall"""
+        return super()._search(self._normalize_query(embedding), k)
+
+
+def measure_recall(
+    storage: HnswVectorStorage, queries: np.ndarray, top_k: int,
+    ef_values=DEFAULT_EF_VALUES, sample_stored: int = 0, seed: int = 0,
+) -> dict:
+    """
+    Recall@k của HNSW so với tìm chính xác và latency trung bình, quét các giá trị ef_search
+
+    sample_stored: thêm tối đa N vector đã lưu (chọn ngẫu nhiên) làm query - cần khi chỉ
+    có ít câu hỏi thật
+
+    Returns:
+        {"namespace", "vectors", "top_k", "queries", "exact_ms", "ef": [{"ef_search", "recall_at_k", "ann_ms", "speedup"}]}
+    """
+    # Đo trên index thật, không phải fallback tìm chính xác lúc index còn đang build
+    storage._adopt_index(wait=True)
+    k = min(top_k, len(storage._row_of))
+    queries = [storage._normalize_query(q) for q in queries]
+    if sample_stored > 0 and storage._row_of:
+        rows = np.flatnonzero(storage._alive[:storage._rows])
+        sample = np.random.default_rng(seed).choice(rows, size=min(sample_stored, len(rows)), replace=False)
+        queries.extend(np.asarray(storage._vectors[np.sort(sample)], dtype=np.float32))
+    report = {"namespace": storage.namespace, "vectors": len(storage._row_of), "top_k": k,
+              "queries": len(queries), "exact_ms": 0.0, "ef": []}
+    if k == 0 or not queries:
+        return report
+
+    start = time.perf_counter()
+    truth = [set(storage.exact_search(q, k)[0].tolist()) for q in queries]
+    report["exact_ms"] = round((time.perf_counter() - start) * 1000 / len(queries), 3)
+
+    configured_ef = storage.ef_search
+    try:
+        for ef in ef_values:
+            storage.ef_search = ef
+            start = time.perf_counter()
+            found = [storage._search(q, k)[0].tolist() for q in queries]
+            ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = float(np.mean([len(truth_set.intersection(rows)) / k for truth_set, rows in zip(truth, found)]))
+            report["ef"].append({
+                "ef_search": max(ef, k),
+                "recall_at_k": round(recall, 4),
+                "ann_ms": round(ann_ms, 3),
+                "speedup": round(report["exact_ms"] / ann_ms, 2) if ann_ms > 0 else 0.0,
+            })
+    finally:
+        storage.ef_search = configured_ef
+    return report
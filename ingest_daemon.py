@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Ingestion daemon - theo dõi thư mục inputs/ và insert tài liệu mới vào LightRAG
+
+Pipeline 3 tầng chạy chồng lên nhau, nối bằng hàng đợi có giới hạn (backpressure):
+    scan (poll thư mục) -> convert (Docling trên thread pool) -> insert (batch rag.ainsert)
+
+- Phát hiện file mới / thay đổi theo mtime+size, xác nhận bằng SHA-256 nội dung
+- Bỏ qua bản trùng hoàn toàn (cùng SHA-256, kể cả khác tên file) trước khi convert
+- Bỏ qua bản gần trùng (MinHash trên văn bản tiếng Việt sau khi convert)
+- Gộp nhiều tài liệu vào một lệnh rag.ainsert([...], ids=..., file_paths=...)
+- File đã insert nhưng bị sửa: xoá document cũ (adelete_by_doc_id) rồi insert lại,
+  hoặc chỉ xoá nếu nội dung mới trùng / gần trùng file khác
+- Trạng thái lưu ở <working_dir>/ingest_state.json (chạy lại không insert lại);
+  file lỗi (kể cả document LightRAG đánh FAILED trong doc_status) được thử lại khi bị sửa hoặc touch
+
+Chạy:
+    python ingest_daemon.py                          # theo dõi ./inputs liên tục
+    python ingest_daemon.py --once                   # quét một lần, xử lý xong thì thoát
+    python ingest_daemon.py --inputs-dir ./inputs --batch-size 16 --convert-workers 4
+    python ingest_daemon.py --near-dup-threshold 0.9 --save-markdown
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+from dataclasses import dataclass
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from lightrag.base import DocStatus
+from minhash_dedupe import MinHashIndex
+from timing_spans import span
+
+TEXT_EXTENSIONS = (".txt", ".md")
+DOCLING_EXTENSIONS = (".pdf", ".docx", ".pptx", ".xlsx", ".html", ".htm")
+STATE_FILE_NAME = "ingest_state.json"
+
+# File vừa sửa trong khoảng này (giây) có thể đang được copy - đợi lần quét sau
+SETTLE_SECONDS = 2.0
+
+
+@dataclass
+class Document:
+    """Tài liệu đã convert, chờ insert"""
+    path: str
+    sha256: str
+    doc_id: str
+    text: str
+    signature: np.ndarray
+    convert_seconds: float
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestState:
+    """Trạng thái từng file: sha256, mtime, size, status, doc_id, chữ ký MinHash"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+
+    def by_sha256(self, sha256: str, exclude: str | None = None) -> str | None:
+        """File khác đã insert với cùng nội dung"""
+        for key, entry in self.files.items():
+            if key != exclude and entry.get("sha256") == sha256 and entry.get("status") == "inserted":
+                return key
+        return None
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "updated_at": datetime.now().isoformat()}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class IngestDaemon:
+    def __init__(self, rag, args):
+        self.rag = rag
+        self.inputs_dir = Path(args.inputs_dir)
+        self.batch_size = args.batch_size
+        self.batch_wait_s = args.batch_wait
+        self.poll_interval = args.poll_interval
+        self.save_markdown = args.save_markdown
+        self.once = args.once
+        self.state = IngestState(os.path.join(rag.working_dir, STATE_FILE_NAME))
+        self.index = MinHashIndex(threshold=args.near_dup_threshold)
+        for key, entry in self.state.files.items():
+            if entry.get("status") == "inserted" and entry.get("signature"):
+                self.index.add(key, np.asarray(entry["signature"], dtype=np.uint64))
+
+        self.convert_workers = args.convert_workers
+        self._executor = ThreadPoolExecutor(max_workers=args.convert_workers, thread_name_prefix="docling")
+        self._local = threading.local()
+        self.convert_queue: asyncio.Queue = asyncio.Queue(maxsize=args.convert_workers * 2)
+        self.insert_queue: asyncio.Queue = asyncio.Queue(maxsize=args.batch_size * 2)
+        self._in_progress: set[str] = set()
+        # adelete_by_doc_id bị từ chối khi pipeline đang insert -> xoá / insert tuần tự
+        self._rag_lock = asyncio.Lock()
+        self.stats = {
+            "scanned": 0, "inserted": 0, "duplicates": 0, "near_duplicates": 0, "failed": 0,
+            "batches": 0, "convert_seconds": 0.0, "insert_seconds": 0.0,
+        }
+
+    # ---------- scan ----------
+
+    def _changed_files(self) -> list[Path]:
+        """File hỗ trợ có mtime/size khác với trạng thái đã lưu"""
+        changed = []
+        now = time.time()
+        for path in sorted(self.inputs_dir.rglob("*")):
+            relative = path.relative_to(self.inputs_dir)
+            # Bỏ qua file ẩn và thư mục của lightrag-server (vd: __enqueued__)
+            if any(part.startswith((".", "__")) for part in relative.parts):
+                continue
+            if not path.is_file() or path.suffix.lower() not in TEXT_EXTENSIONS + DOCLING_EXTENSIONS:
+                continue
+            key = str(relative)
+            stat = path.stat()
+            if key in self._in_progress or now - stat.st_mtime < SETTLE_SECONDS:
+                continue
+            entry = self.state.files.get(key)
+            if entry and entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+                continue
+            changed.append(path)
+        return changed
+
+    async def scan(self):
+        while True:
+            for path in self._changed_files():
+                self._in_progress.add(str(path.relative_to(self.inputs_dir)))
+                self.stats["scanned"] += 1
+                await self.convert_queue.put(path)
+            if self.once:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+    # ---------- convert ----------
+
+    def _docling_converter(self):
+        # Mỗi worker thread một DocumentConverter (tạo lần đầu, dùng lại)
+        converter = getattr(self._local, "converter", None)
+        if converter is None:
+            from docling.document_converter import DocumentConverter
+            converter = self._local.converter = DocumentConverter()
+        return converter
+
+    def _convert(self, path: Path) -> str:
+        """Chạy trên thread pool: đọc text hoặc convert bằng Docling"""
+        if path.suffix.lower() in TEXT_EXTENSIONS:
+            return path.read_text(encoding="utf-8", errors="ignore")
+        with span("docling_conversion", filename=path.name):
+            markdown = self._docling_converter().convert(str(path)).document.export_to_markdown()
+        if self.save_markdown:
+            from docling_markdown_export import save_docling_markdown
+            save_docling_markdown(path.name, markdown)
+        return markdown
+
+    def _mark(self, key: str, path: Path, sha256: str, status: str, **fields):
+        # File có thể đã bị xoá trong lúc xử lý
+        stat = path.stat() if path.exists() else None
+        previous = self.state.files.get(key, {})
+        self.state.files[key] = {
+            # Giữ doc_id cũ để xoá khi file được insert lại
+            **({"doc_id": previous["doc_id"]} if previous.get("doc_id") else {}),
+            "sha256": sha256,
+            "mtime": stat.st_mtime if stat else None,
+            "size": stat.st_size if stat else None,
+            "status": status, "updated_at": datetime.now().isoformat(), **fields,
+        }
+        self._in_progress.discard(key)
+
+    async def convert_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            path = await self.convert_queue.get()
+            key = str(path.relative_to(self.inputs_dir))
+            try:
+                sha256 = await loop.run_in_executor(self._executor, file_sha256, path)
+                previous = self.state.files.get(key, {})
+                if previous.get("sha256") == sha256 and previous.get("status") != "failed":
+                    # Chỉ đổi mtime (touch / copy lại): cập nhật trạng thái, không xử lý lại
+                    self._mark(key, path, sha256, previous["status"],
+                               **{k: v for k, v in previous.items() if k in ("duplicate_of", "signature", "inserted_at")})
+                    continue
+
+                duplicate_of = self.state.by_sha256(sha256, exclude=key)
+                if duplicate_of:
+                    self.stats["duplicates"] += 1
+                    self.index.remove(key)
+                    await self._retire(key)
+                    self._mark(key, path, sha256, "duplicate", duplicate_of=duplicate_of)
+                    print(f"⏭️  {key}: trùng nội dung với {duplicate_of}")
+                    continue
+
+                start = time.perf_counter()
+                text = await loop.run_in_executor(self._executor, self._convert, path)
+                convert_seconds = time.perf_counter() - start
+                self.stats["convert_seconds"] += convert_seconds
+                if not text.strip():
+                    self.stats["failed"] += 1
+                    self._mark(key, path, sha256, "failed", error="empty document")
+                    continue
+
+                signature = await loop.run_in_executor(self._executor, self.index.signature, text)
+                # Phiên bản cũ của chính file này không tính là bản trùng
+                self.index.remove(key)
+                near_duplicate_of, similarity = self.index.query(signature)
+                if near_duplicate_of:
+                    self.stats["near_duplicates"] += 1
+                    await self._retire(key)
+                    self._mark(key, path, sha256, "near_duplicate",
+                               duplicate_of=near_duplicate_of, similarity=round(similarity, 3))
+                    print(f"⏭️  {key}: gần trùng với {near_duplicate_of} (similarity {similarity:.2f})")
+                    continue
+
+                # Đăng ký ngay để các file đang convert song song so sánh được với file này
+                self.index.add(key, signature)
+                await self.insert_queue.put(Document(
+                    path=key, sha256=sha256, doc_id=f"doc-{sha256[:32]}",
+                    text=text, signature=signature, convert_seconds=convert_seconds,
+                ))
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"❌ {key}: convert lỗi: {e}")
+                self._mark(key, path, self.state.files.get(key, {}).get("sha256", ""), "failed", error=str(e))
+            finally:
+                self.convert_queue.task_done()
+
+    # ---------- insert ----------
+
+    async def _next_batch(self) -> list[Document]:
+        """Đợi document đầu tiên, sau đó gom thêm tối đa batch_wait giây"""
+        batch = [await self.insert_queue.get()]
+        deadline = time.perf_counter() + self.batch_wait_s
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.insert_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _delete_document(self, key: str, doc_id: str) -> bool:
+        """adelete_by_doc_id (gọi khi đang giữ _rag_lock); True nếu document không còn"""
+        try:
+            result = await self.rag.adelete_by_doc_id(doc_id)
+        except Exception as e:
+            print(f"⚠️  {key}: không xoá được document cũ {doc_id}: {e}")
+            return False
+        if result.status not in ("success", "not_found"):
+            print(f"⚠️  {key}: không xoá được document cũ {doc_id}: {result.message}")
+            return False
+        print(f"🗑️  {key}: đã xoá document cũ {doc_id}")
+        return True
+
+    async def _retire(self, key: str):
+        """File đã insert nay bị bỏ qua (trùng / gần trùng): xoá document cũ khỏi LightRAG"""
+        doc_id = self.state.files.get(key, {}).get("doc_id")
+        if not doc_id:
+            return
+        async with self._rag_lock:
+            deleted = await self._delete_document(key, doc_id)
+        if deleted:
+            # Không còn document nào của file này (xoá lỗi: giữ doc_id để xoá ở lần sau)
+            self.state.files[key].pop("doc_id", None)
+
+    async def _delete_previous(self, batch: list[Document]):
+        """Xoá document cũ của các file đã insert trước đó và nay bị sửa"""
+        for doc in batch:
+            old_doc_id = self.state.files.get(doc.path, {}).get("doc_id")
+            if old_doc_id and old_doc_id != doc.doc_id:
+                await self._delete_document(doc.path, old_doc_id)
+
+    async def insert_worker(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                async with self._rag_lock:
+                    await self._delete_previous(batch)
+                    start = time.perf_counter()
+                    with span("ainsert", filename=f"{batch[0].path} (+{len(batch) - 1})" if len(batch) > 1 else batch[0].path):
+                        await self.rag.ainsert(
+                            [doc.text for doc in batch],
+                            ids=[doc.doc_id for doc in batch],
+                            file_paths=[doc.path for doc in batch],
+                        )
+            except Exception as e:
+                self.stats["failed"] += len(batch)
+                print(f"❌ Insert batch lỗi ({len(batch)} docs): {e}")
+                for doc in batch:
+                    self.index.remove(doc.path)
+                    self._mark(doc.path, self.inputs_dir / doc.path, doc.sha256, "failed", error=str(e))
+            else:
+                elapsed = time.perf_counter() - start
+                # ainsert không raise khi extraction của từng document lỗi - LightRAG ghi FAILED vào doc_status
+                statuses = await self.rag.doc_status.get_by_ids([doc.doc_id for doc in batch])
+                failed = 0
+                for doc, status in zip(batch, statuses):
+                    if status and status.get("status") == DocStatus.FAILED:
+                        failed += 1
+                        error = status.get("error_msg") or "LightRAG processing failed"
+                        print(f"❌ {doc.path}: insert lỗi: {error}")
+                        self.index.remove(doc.path)
+                        # Giữ doc_id: document FAILED vẫn nằm trong LightRAG, xoá khi file được insert lại
+                        self._mark(doc.path, self.inputs_dir / doc.path, doc.sha256, "failed",
+                                   doc_id=doc.doc_id, error=error)
+                    else:
+                        self._mark(doc.path, self.inputs_dir / doc.path, doc.sha256, "inserted",
+                                   doc_id=doc.doc_id, signature=doc.signature.tolist(),
+                                   inserted_at=datetime.now().isoformat())
+                self.stats["batches"] += 1
+                self.stats["inserted"] += len(batch) - failed
+                self.stats["failed"] += failed
+                self.stats["insert_seconds"] += elapsed
+                print(f"📥 Batch {self.stats['batches']}: {len(batch) - failed}/{len(batch)} docs trong {elapsed:.1f}s "
+                      f"(chờ convert: {self.convert_queue.qsize()}, chờ insert: {self.insert_queue.qsize()})")
+            finally:
+                self.state.save()
+                for _ in batch:
+                    self.insert_queue.task_done()
+
+    # ---------- run ----------
+
+    async def run(self):
+        workers = [asyncio.create_task(self.convert_worker()) for _ in range(self.convert_workers)]
+        workers.append(asyncio.create_task(self.insert_worker()))
+        try:
+            await self.scan()
+            # --once: đợi tầng convert rồi tầng insert xử lý hết
+            await self.convert_queue.join()
+            await self.insert_queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.state.save()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def print_summary(self):
+        s = self.stats
+        print("\n" + "="*60)
+        print("📊 Ingestion summary")
+        print("="*60)
+        print(f"Scanned: {s['scanned']} | Inserted: {s['inserted']} | Duplicates: {s['duplicates']} | "
+              f"Near-duplicates: {s['near_duplicates']} | Failed: {s['failed']}")
+        if s["batches"]:
+            print(f"Batches: {s['batches']} (avg {s['inserted'] / s['batches']:.1f} docs/batch) | "
+                  f"Convert: {s['convert_seconds']:.1f}s | Insert: {s['insert_seconds']:.1f}s")
+
+
+async def main(args):
+    from lightrag_vietnamese_demo import initialize_rag, setup_model, llm_client
+
+    Path(args.inputs_dir).mkdir(parents=True, exist_ok=True)
+    await setup_model()
+    rag = await initialize_rag(args.working_dir)
+    daemon = IngestDaemon(rag, args)
+    print(f"👀 Theo dõi {args.inputs_dir} -> {rag.working_dir} "
+          f"(batch {args.batch_size}, {args.convert_workers} convert workers, "
+          f"{len(daemon.state.files)} file đã biết)")
+    try:
+        await daemon.run()
+    finally:
+        daemon.print_summary()
+        await rag.finalize_storages()
+        await llm_client.aclose()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingestion daemon cho LightRAG (theo dõi thư mục inputs)")
+    parser.add_argument("--inputs-dir", default="./inputs", help="Thư mục theo dõi")
+    parser.add_argument("--working-dir", default=None, help="LightRAG working dir (mặc định như demo)")
+    parser.add_argument("--once", action="store_true", help="Quét một lần, xử lý xong thì thoát")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Chu kỳ quét thư mục (giây)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("INGEST_BATCH_SIZE", "8")),
+                        help="Số document tối đa mỗi lệnh ainsert")
+    parser.add_argument("--batch-wait", type=float, default=3.0,
+                        help="Thời gian gom thêm document sau document đầu tiên (giây)")
+    parser.add_argument("--convert-workers", type=int, default=int(os.getenv("INGEST_CONVERT_WORKERS", "2")),
+                        help="Số thread convert Docling song song")
+    parser.add_argument("--near-dup-threshold", type=float, default=0.85,
+                        help="Jaccard (MinHash) tối thiểu để coi là gần trùng")
+    parser.add_argument("--save-markdown", action="store_true",
+                        help="Lưu markdown của Docling vào ./docling_markdown")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        print("\n⏹️  Dừng ingestion daemon")
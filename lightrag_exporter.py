@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Prometheus exporter cho LightRAG Server
+
+Mỗi lần scrape gọi API của LightRAG Server và publish:
+- lightrag_up                          server có phản hồi hay không
+- lightrag_documents{status=...}       số document theo trạng thái (không giới hạn 100)
+- lightrag_documents_total             tổng số document
+- lightrag_pipeline_busy               pipeline đang xử lý
+- lightrag_pipeline_docs / _batches / _current_batch
+- lightrag_pipeline_request_pending
+- lightrag_exporter_scrape_seconds     thời gian gọi API
+
+Chạy:
+    python lightrag_exporter.py                      # http://localhost:9622/metrics
+    LIGHTRAG_URL=http://localhost:9621 EXPORTER_PORT=9622 python lightrag_exporter.py
+"""
+
+import os
+import json
+import time
+import urllib.request
+from prometheus_client import start_http_server
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+LIGHTRAG_URL = os.getenv("LIGHTRAG_URL", "http://localhost:9621")
+LIGHTRAG_API_KEY = os.getenv("LIGHTRAG_API_KEY")
+EXPORTER_PORT = int(os.getenv("EXPORTER_PORT", "9622"))
+REQUEST_TIMEOUT = 5
+
+
+def fetch_json(path: str) -> dict:
+    request = urllib.request.Request(f"{LIGHTRAG_URL}{path}")
+    if LIGHTRAG_API_KEY:
+        request.add_header("X-API-Key", LIGHTRAG_API_KEY)
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def fetch_status_counts() -> dict:
+    """Số document theo trạng thái - dùng /documents/status_counts, fallback /documents"""
+    try:
+        counts = fetch_json("/documents/status_counts").get("status_counts", {})
+    except Exception:
+        statuses = fetch_json("/documents").get("statuses", {})
+        counts = {status: len(docs) for status, docs in statuses.items()}
+    # status_counts có thêm "all" (tổng) - không phải trạng thái
+    return {status: count for status, count in counts.items() if status.lower() != "all"}
+
+
+class LightRAGCollector:
+    """Collector gọi LightRAG Server tại thời điểm scrape"""
+
+    def collect(self):
+        start = time.perf_counter()
+        up = GaugeMetricFamily("lightrag_up", "LightRAG server reachable")
+        try:
+            counts = fetch_status_counts()
+            pipeline = fetch_json("/documents/pipeline_status")
+        except Exception as e:
+            print(f"[exporter] scrape failed: {e}")
+            up.add_metric([], 0)
+            yield up
+            return
+
+        up.add_metric([], 1)
+        yield up
+
+        documents = GaugeMetricFamily("lightrag_documents", "Documents by status", labels=["status"])
+        for status, count in sorted(counts.items()):
+            documents.add_metric([status.lower()], count)
+        yield documents
+        yield GaugeMetricFamily("lightrag_documents_total", "Total documents", value=sum(counts.values()))
+
+        for name, key, doc in [
+            ("lightrag_pipeline_busy", "busy", "Pipeline is processing documents"),
+            ("lightrag_pipeline_docs", "docs", "Documents in current pipeline job"),
+            ("lightrag_pipeline_batches", "batchs", "Batches in current pipeline job"),
+            ("lightrag_pipeline_current_batch", "cur_batch", "Batch being processed"),
+            ("lightrag_pipeline_request_pending", "request_pending", "Another scan/insert request is pending"),
+        ]:
+            yield GaugeMetricFamily(name, doc, value=float(pipeline.get(key) or 0))
+
+        yield GaugeMetricFamily(
+            "lightrag_exporter_scrape_seconds", "Time spent calling LightRAG API",
+            value=time.perf_counter() - start,
+        )
+
+
+if __name__ == "__main__":
+    REGISTRY.register(LightRAGCollector())
+    start_http_server(EXPORTER_PORT)
+    print(f"✓ LightRAG exporter: http://localhost:{EXPORTER_PORT}/metrics (source: {LIGHTRAG_URL})")
+    while True:
+        time.sleep(3600)
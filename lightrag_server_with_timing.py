@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Khởi động lightrag-server với timing spans
+
+Gắn span vào Docling conversion, ainsert và pipeline processing rồi chạy đúng
+entrypoint của lightrag-server (nhận cùng tham số dòng lệnh). Sự kiện được ghi
+theo batch vào TIMING_LOG_FILE để timing_report.py phân tích. Timing bật mặc định
+ở launcher này (TIMING_ENABLED=false để tắt).
+
+Chạy:
+    python lightrag_server_with_timing.py --docling --port 9621 ...
+    TIMING_SAMPLE_RATE=0.1 python lightrag_server_with_timing.py --docling
+"""
+
+import os
+from timing_spans import configure, install_lightrag_hooks
+
+if __name__ == "__main__":
+    configure(enabled=os.getenv("TIMING_ENABLED", "true").lower() == "true")
+    install_lightrag_hooks()
+
+    from lightrag.api.lightrag_server import main
+    main()
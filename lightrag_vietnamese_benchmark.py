@@ -10,26 +10,39 @@ Benchmark metrics:
 - Số entities/relations truy xuất
 - Số tokens sử dụng
 - Độ chính xác (so sánh với ground truth)
-- Memory usage
+- Memory usage (RSS delta hoặc tracemalloc peak allocation)
+- Phân phối latency cold-cache vs warm-cache (LLM cache), đo với stream=False
+- Streaming: time-to-first-token (TTFT) và tokens/sec theo từng mode (các lần đo riêng)
 
 Chạy:
     python lightrag_vietnamese_benchmark.py
+    python lightrag_vietnamese_benchmark.py --memory-mode tracemalloc
+    python lightrag_vietnamese_benchmark.py --warmup 1 --repeat 5 --cache-state both
+    python lightrag_vietnamese_benchmark.py --no-stream          # bỏ các lần đo streaming
+    python lightrag_vietnamese_benchmark.py --profile            # sampling, file .collapsed
+    python lightrag_vietnamese_benchmark.py --profile cprofile   # file .prof
+    python lightrag_vietnamese_benchmark.py --vector-storage MmapVectorStorage
+    python lightrag_vietnamese_benchmark.py --vector-storage HnswVectorStorage   # + recall@k vs exact
 """
 
 import os
 import asyncio
+import argparse
 import json
 import time
-import psutil
 import numpy as np
 from typing import Literal, cast
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from openai import AsyncOpenAI
 from lightrag import LightRAG, QueryParam
-from lightrag.llm.openai import openai_complete_if_cache
 from lightrag.utils import wrap_embedding_func_with_attrs, setup_logger
 from sentence_transformers import SentenceTransformer
+from benchmark_memory import MemoryProfiler, MEMORY_MODES
+from profiling_hooks import Profiler, PROFILE_MODES, print_profile_summary
+from embedding_adapter import BatchingEmbeddingAdapter
+from llm_client import PooledLLMClient, AdaptiveLimiter, print_llm_stats
+from mmap_vector_storage import register_vector_storages
 
 # Cấu hình logging
 setup_logger("lightrag", level="WARNING")  # Giảm log để benchmark chính xác hơn
@@ -50,8 +63,36 @@ LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://10.8.0.8:8000/v1")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "not-needed")
 LLM_MODEL = os.getenv("LLM_MODEL", "Qwen3-Coder-30B-A3B-Instruct")
 
+# Pool kết nối keep-alive + concurrency tự điều chỉnh (AIMD) theo tải của server LLM
+# MAX_ASYNC là concurrency khởi điểm; limiter tăng tới LLM_MAX_CONCURRENCY khi latency
+# còn phẳng và giảm khi timeout / 429 / 503
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+llm_client = PooledLLMClient(
+    LLM_BASE_URL, LLM_API_KEY,
+    AdaptiveLimiter(
+        initial=int(os.getenv("MAX_ASYNC", "4")),
+        min_concurrency=LLM_MIN_CONCURRENCY,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+    ),
+    timeout=LLM_TIMEOUT,
+)
+
 openai_client = AsyncOpenAI(base_url=LLM_BASE_URL, api_key=LLM_API_KEY)
 
+# ============================================
+# Vector storage
+# ============================================
+# NanoVectorDBStorage (mặc định của LightRAG, file JSON) hoặc MmapVectorStorage
+# (memmap nhị phân - khởi động nhanh, ít RSS, append không ghi lại toàn bộ)
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "NanoVectorDBStorage")
+register_vector_storages()
+
+# Số kết quả tìm kiếm vector của LightRAG (dùng khi đo recall@k của HNSW)
+TOP_K = int(os.getenv("TOP_K", "40"))
+CHUNK_TOP_K = int(os.getenv("CHUNK_TOP_K", "20"))
+
 # ============================================
 # Cấu hình Embedding
 # ============================================
@@ -62,6 +103,18 @@ print(f"Đang tải model embedding: {EMBEDDING_MODEL_NAME}...")
 embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 print(f"✓ Model embedding đã tải xong!")
 
+# Text dài hơn cửa sổ của model: "none" (model tự cắt), "mean" / "max" (tách câu + pool)
+# ⚠️ Đổi pooling sau khi đã insert documents sẽ làm vector cũ/mới không đồng nhất
+EMBEDDING_POOLING = os.getenv("EMBEDDING_POOLING", "none")
+EMBEDDING_WINDOW_TOKENS = int(os.getenv("EMBEDDING_WINDOW_TOKENS", "200"))
+
+# Encode trên worker thread + gộp các lệnh gọi đồng thời thành batch
+embedding_adapter = BatchingEmbeddingAdapter(
+    embedding_model,
+    pooling=None if EMBEDDING_POOLING == "none" else EMBEDDING_POOLING,
+    window_tokens=EMBEDDING_WINDOW_TOKENS,
+)
+
 
 @dataclass
 class QueryBenchmarkResult:
@@ -74,6 +127,14 @@ class QueryBenchmarkResult:
     chunks_count: int = 0
     response_length: int = 0
     memory_usage_mb: float = 0.0
+    streamed: bool = False
+    ttft_ms: float = 0.0
+    output_tokens: int = 0
+    tokens_per_sec: float = 0.0
+    cache_state: str = "warm"
+    repetition: int = 1
+    peak_alloc_mb: float = 0.0
+    top_allocations: list = field(default_factory=list)
     timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
 
 
@@ -83,24 +144,28 @@ class BenchmarkReport:
     model_name: str
     embedding_model: str
     total_queries: int
+    vector_storage: str = "NanoVectorDBStorage"
+    ann_recall: list = field(default_factory=list)
     results: list = field(default_factory=list)
     summary: dict = field(default_factory=dict)
+    memory_profile: dict = field(default_factory=dict)
+    cpu_profile: dict = field(default_factory=dict)
+    embedding_stats: dict = field(default_factory=dict)
+    llm_stats: dict = field(default_factory=dict)
     generated_at: str = field(default_factory=lambda: datetime.now().isoformat())
 
 
 async def llm_model_func(
     prompt, system_prompt=None, history_messages=[], keyword_extraction=False, **kwargs
 ) -> str:
-    return await openai_complete_if_cache(
+    return await llm_client.complete(
         LLM_MODEL, prompt, system_prompt=system_prompt,
-        history_messages=history_messages, api_key=LLM_API_KEY,
-        base_url=LLM_BASE_URL, **kwargs,
+        history_messages=history_messages, **kwargs,
     )
 
 
 async def vietnamese_embedding_func(texts: list[str]) -> np.ndarray:
-    embeddings = embedding_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-    return embeddings
+    return await embedding_adapter(texts)
 
 
 @wrap_embedding_func_with_attrs(
@@ -110,12 +175,16 @@ async def embedding_func(texts: list[str]) -> np.ndarray:
     return await vietnamese_embedding_func(texts)
 
 
-async def initialize_rag():
+async def initialize_rag(vector_storage: str = VECTOR_STORAGE):
     rag = LightRAG(
         working_dir=WORKING_DIR,
         llm_model_func=llm_model_func,
         llm_model_name=LLM_MODEL,
+        llm_model_max_async=LLM_MAX_CONCURRENCY,
+        # LightRAG huỷ lệnh gọi LLM sau 2 x default_llm_timeout - khớp với timeout của llm_client
+        default_llm_timeout=int(LLM_TIMEOUT),
         embedding_func=embedding_func,
+        vector_storage=vector_storage,
         addon_params={
             "language": "Vietnamese",
             "entity_types": ["organization", "person", "location", "event", "product"],
@@ -125,47 +194,81 @@ async def initialize_rag():
     return rag
 
 
-def get_memory_usage():
-    """Lấy memory usage hiện tại (MB)"""
-    process = psutil.Process(os.getpid())
-    return process.memory_info().rss / 1024 / 1024
+CACHE_STATES = ("cold", "warm", "both")
+# Loại cache do query tạo ra (key "{mode}:{cache_type}:{hash}"); "extract" / "summary" của
+# ingestion dùng mode "default" và được giữ lại
+QUERY_CACHE_TYPES = ("query", "keywords")
+
 
+async def clear_llm_cache(rag, mode: str):
+    """Xoá cache câu trả lời + keyword extraction của `mode` để query tiếp theo chạy cold"""
+    cache = rag.llm_response_cache
+    prefixes = tuple(f"{mode}:{cache_type}:" for cache_type in QUERY_CACHE_TYPES)
+    async with cache._storage_lock:
+        keys = [key for key in cache._data if key.startswith(prefixes)]
+    if keys:
+        await cache.delete(keys)
 
-async def benchmark_query(rag, query: str, mode: str) -> QueryBenchmarkResult:
+
+def count_tokens(rag, text: str) -> int:
+    """Đếm số tokens bằng tokenizer của LightRAG (fallback: số từ)"""
+    try:
+        return len(rag.tokenizer.encode(text))
+    except Exception:
+        return len(text.split())
+
+
+async def benchmark_query(
+    rag, query: str, mode: str, profiler: MemoryProfiler,
+    cache_state: str = "warm", repetition: int = 1, stream: bool = True,
+) -> QueryBenchmarkResult:
     """
     Thực hiện query và đo các metrics
+    
+    stream=True: đo thêm time-to-first-token (TTFT) và tokens/sec của phần sinh câu trả lời.
+    Response trả về dạng string (cache hit, không có context) được tính TTFT = tổng thời gian.
     """
     mode_literal = cast(Literal["naive", "local", "global", "hybrid"], mode)
+    first_token_time = None
+    streamed = False
     
-    # Đo memory trước khi query
-    mem_before = get_memory_usage()
-    
-    # Đo thởi gian
-    start_time = time.perf_counter()
-    
-    try:
-        resp = await rag.aquery(
-            query,
-            param=QueryParam(mode=mode_literal, stream=False, enable_rerank=False)
-        )
+    # Đo memory quanh query (RSS delta hoặc tracemalloc peak)
+    with profiler.measure(f"{mode}:{query}") as mem_sample:
+        # Đo thởi gian
+        start_time = time.perf_counter()
         
-        # Xử lý response
-        if hasattr(resp, '__iter__') and not isinstance(resp, str):
-            response_text = ""
-            async for chunk in resp:
-                response_text += chunk
-        else:
-            response_text = str(resp)
+        try:
+            resp = await rag.aquery(
+                query,
+                param=QueryParam(mode=mode_literal, stream=stream, enable_rerank=False)
+            )
             
-    except Exception as e:
-        response_text = f"ERROR: {str(e)}"
+            # Xử lý response
+            if hasattr(resp, '__aiter__'):
+                streamed = True
+                response_text = ""
+                async for chunk in resp:
+                    if chunk and first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    response_text += chunk
+            else:
+                response_text = str(resp)
+                
+        except Exception as e:
+            response_text = f"ERROR: {str(e)}"
+        
+        # Tính thởi gian
+        end_time = time.perf_counter()
+        execution_time = (end_time - start_time) * 1000  # Convert to ms
     
-    # Tính thởi gian
-    execution_time = (time.perf_counter() - start_time) * 1000  # Convert to ms
+    if first_token_time is None:
+        first_token_time = end_time
+    ttft = (first_token_time - start_time) * 1000
     
-    # Đo memory sau khi query
-    mem_after = get_memory_usage()
-    memory_used = mem_after - mem_before
+    # Tốc độ sinh: tokens / thời gian từ token đầu tiên đến hết response
+    output_tokens = count_tokens(rag, response_text)
+    generation_time = end_time - first_token_time
+    tokens_per_sec = output_tokens / generation_time if streamed and generation_time > 0 else 0.0
     
     # Đếm số lượng (ước tính từ response)
     entities_count = response_text.lower().count("**") // 2  # Markdown bold thường dùng cho entities
@@ -177,7 +280,15 @@ async def benchmark_query(rag, query: str, mode: str) -> QueryBenchmarkResult:
         execution_time_ms=round(execution_time, 2),
         entities_count=entities_count,
         response_length=response_length,
-        memory_usage_mb=round(memory_used, 2),
+        memory_usage_mb=round(mem_sample.usage_mb, 2),
+        streamed=streamed,
+        ttft_ms=round(ttft, 2),
+        output_tokens=output_tokens,
+        tokens_per_sec=round(tokens_per_sec, 2),
+        cache_state=cache_state,
+        repetition=repetition,
+        peak_alloc_mb=mem_sample.peak_alloc_mb,
+        top_allocations=mem_sample.top_allocations,
     )
 
 
@@ -188,7 +299,7 @@ def print_benchmark_table(results: list[QueryBenchmarkResult]):
     print("="*100)
     
     # Header
-    print(f"\n{'Query':<40} {'Mode':<10} {'Time(ms)':<12} {'Entities':<10} {'Response':<12} {'Memory(MB)':<12}")
+    print(f"\n{'Query':<40} {'Mode':<10} {'Cache':<10} {'Time(ms)':<12} {'TTFT(ms)':<12} {'Entities':<10} {'Response':<12} {'Memory(MB)':<12}")
     print("-"*100)
     
     # Group by query
@@ -198,8 +309,9 @@ def print_benchmark_table(results: list[QueryBenchmarkResult]):
             current_query = result.query
             print(f"\n🔍 {result.query}")
         
-        print(f"{'':<40} {result.mode:<10} {result.execution_time_ms:<12.2f} "
-              f"{result.entities_count:<10} {result.response_length:<12} {result.memory_usage_mb:<12.2f}")
+        cache_label = f"{result.cache_state}#{result.repetition}"
+        print(f"{'':<40} {result.mode:<10} {cache_label:<10} {result.execution_time_ms:<12.2f} "
+              f"{result.ttft_ms:<12.2f} {result.entities_count:<10} {result.response_length:<12} {result.memory_usage_mb:<12.2f}")
 
 
 def generate_summary(results: list[QueryBenchmarkResult]) -> dict:
@@ -209,6 +321,10 @@ def generate_summary(results: list[QueryBenchmarkResult]) -> dict:
     
     for mode in modes:
         mode_results = [r for r in results if r.mode == mode]
+        # Chỉ các lần thực sự stream (cache hit / --no-stream có tokens_per_sec = 0)
+        streamed_results = [r for r in mode_results if r.streamed and r.tokens_per_sec > 0]
+        # TTFT từ các lần đo streaming; --no-stream: TTFT = tổng thời gian
+        ttft_results = [r for r in mode_results if r.streamed] or mode_results
         if mode_results:
             summary[mode] = {
                 "avg_time_ms": round(sum(r.execution_time_ms for r in mode_results) / len(mode_results), 2),
@@ -216,8 +332,24 @@ def generate_summary(results: list[QueryBenchmarkResult]) -> dict:
                 "avg_entities": round(sum(r.entities_count for r in mode_results) / len(mode_results), 1),
                 "avg_response_length": round(sum(r.response_length for r in mode_results) / len(mode_results), 0),
                 "avg_memory_mb": round(sum(r.memory_usage_mb for r in mode_results) / len(mode_results), 2),
+                "max_peak_alloc_mb": round(max(r.peak_alloc_mb for r in mode_results), 3),
                 "queries_count": len(mode_results),
+                "ttft": latency_stats([r.ttft_ms for r in ttft_results]),
+                "avg_tokens_per_sec": round(
+                    sum(r.tokens_per_sec for r in streamed_results) / len(streamed_results), 2
+                ) if streamed_results else 0.0,
+                "streamed_runs": len(streamed_results),
+                "cache": {},
             }
+            
+            for cache_state in ("cold", "warm"):
+                state_times = [r.execution_time_ms for r in mode_results if r.cache_state == cache_state]
+                if state_times:
+                    summary[mode]["cache"][cache_state] = latency_stats(state_times)
+            
+            cache = summary[mode]["cache"]
+            if "cold" in cache and "warm" in cache and cache["warm"]["p50_ms"] > 0:
+                summary[mode]["cache_speedup"] = round(cache["cold"]["p50_ms"] / cache["warm"]["p50_ms"], 2)
     
     return summary
 
@@ -253,7 +385,162 @@ def print_summary_table(summary: dict):
         print(f"  📊 Chênh lệch tốc độ: {speedup:.2f}x")
 
 
-async def run_benchmark():
+def print_memory_profile(profile: dict):
+    """In bộ nhớ theo phase và bộ nhớ thường trú của storages"""
+    print("\n" + "="*100)
+    print(f"🧠 MEMORY PROFILE (mode: {profile['mode']})")
+    print("="*100)
+    
+    print(f"\n{'Phase':<25} {'RSS Δ(MB)':<12} {'Peak alloc(MB)':<16} {'Retained(MB)':<14}")
+    print("-"*100)
+    for phase in profile["phases"]:
+        print(f"{phase['label']:<25} {phase['rss_delta_mb']:<12.2f} "
+              f"{phase['peak_alloc_mb']:<16.3f} {phase['retained_alloc_mb']:<14.3f}")
+    
+    resident = profile.get("storage_resident", {})
+    if resident:
+        on_disk = resident.get("on_disk_mb", {})
+        print(f"\n  💾 Storage trên đĩa (MB): " + ", ".join(f"{k}={v}" for k, v in on_disk.items()))
+        if "traced_mb" in resident:
+            print(f"  📦 Storage thường trú (MB): " + ", ".join(f"{k}={v}" for k, v in resident["traced_mb"].items()))
+        print(f"  📈 RSS sau khi load storages: {resident.get('rss_mb', 0):.2f} MB")
+    
+    for phase in profile["phases"]:
+        if phase["top_allocations"]:
+            print(f"\n  Top allocations - {phase['label']}:")
+            for alloc in phase["top_allocations"][:5]:
+                print(f"    {alloc['size_diff_kb']:>10.1f} KB  {alloc['location']}")
+
+
+async def run_query_repetitions(
+    rag, query: str, mode: str, profiler: MemoryProfiler, args,
+) -> list[QueryBenchmarkResult]:
+    """
+    Chạy warm-up rồi N lần đo cho một cặp (query, mode) theo từng cache state
+
+    - cold: xoá cache query / keywords của mode trước mỗi lần đo (giữ cache extraction)
+    - warm: warm-up đã nạp cache, các lần đo đều hit cache
+    - stream (khi args.stream): xoá cache rồi query stream=True để đo TTFT / tokens/sec
+
+    Các lần cold / warm luôn dùng stream=False: LightRAG không ghi câu trả lời streaming
+    vào LLM cache, nên warm với streaming không bao giờ hit cache câu trả lời.
+    """
+    cache_states = ["cold", "warm"] if args.cache_state == "both" else [args.cache_state]
+    results = []
+    
+    # Warm-up: không ghi kết quả, làm nóng embedding model / connection và nạp cache
+    for _ in range(args.warmup):
+        await benchmark_query(rag, query, mode, profiler, stream=False)
+    
+    for cache_state in cache_states:
+        for repetition in range(1, args.repeat + 1):
+            if cache_state == "cold":
+                await clear_llm_cache(rag, mode)
+            elif repetition == 1 and args.warmup == 0:
+                # Không có warm-up: chạy một lần để nạp cache trước khi đo warm
+                await benchmark_query(rag, query, mode, profiler, stream=False)
+            results.append(
+                await benchmark_query(rag, query, mode, profiler, cache_state, repetition, stream=False)
+            )
+    
+    if args.stream:
+        for repetition in range(1, args.repeat + 1):
+            # Cache hit trả về string, không stream - xoá để LLM sinh lại câu trả lời
+            await clear_llm_cache(rag, mode)
+            results.append(
+                await benchmark_query(rag, query, mode, profiler, "stream", repetition, stream=True)
+            )
+    
+    return results
+
+
+async def measure_ann_recall(rag, queries: list[str], sample_stored: int) -> list[dict]:
+    """Recall@k của HnswVectorStorage so với tìm chính xác cho chunks / entities / relationships"""
+    from hnsw_vector_storage import measure_recall
+
+    query_vectors = await embedding_func(queries)
+    return [
+        measure_recall(storage, query_vectors, top_k, sample_stored=sample_stored)
+        for storage, top_k in (
+            (rag.chunks_vdb, CHUNK_TOP_K),
+            (rag.entities_vdb, TOP_K),
+            (rag.relationships_vdb, TOP_K),
+        )
+    ]
+
+
+def print_ann_recall(reports: list[dict]):
+    """In recall@k và latency HNSW theo ef_search so với tìm chính xác"""
+    print("\n" + "="*100)
+    print("🧭 ANN RECALL (HNSW vs exact search)")
+    print("="*100)
+    print(f"{'Namespace':<16} {'Vectors':<10} {'k':<5} {'ef_search':<10} {'Recall@k':<10} "
+          f"{'ANN (ms)':<10} {'Exact (ms)':<12} {'Speedup':<10}")
+    print("-"*100)
+    for report in reports:
+        for point in report["ef"]:
+            print(f"{report['namespace']:<16} {report['vectors']:<10} {report['top_k']:<5} "
+                  f"{point['ef_search']:<10} {point['recall_at_k']:<10.3f} {point['ann_ms']:<10.3f} "
+                  f"{report['exact_ms']:<12.3f} {point['speedup']:<10.2f}x")
+
+
+def latency_stats(times_ms: list[float]) -> dict:
+    """Thống kê phân phối latency"""
+    times = np.asarray(times_ms, dtype=float)
+    return {
+        "count": int(times.size),
+        "mean_ms": round(float(times.mean()), 2),
+        "std_ms": round(float(times.std()), 2),
+        "min_ms": round(float(times.min()), 2),
+        "p50_ms": round(float(np.percentile(times, 50)), 2),
+        "p95_ms": round(float(np.percentile(times, 95)), 2),
+        "max_ms": round(float(times.max()), 2),
+    }
+
+
+def print_streaming_table(summary: dict):
+    """In TTFT, tổng latency và tokens/sec theo mode"""
+    print("\n" + "="*100)
+    print("⏱️  STREAMING: TIME-TO-FIRST-TOKEN vs TỔNG LATENCY")
+    print("="*100)
+    
+    print(f"\n{'Mode':<10} {'TTFT p50(ms)':<15} {'TTFT p95(ms)':<15} {'Avg Time(ms)':<15} {'Tokens/sec':<12}")
+    print("-"*100)
+    
+    for mode, stats in summary.items():
+        print(f"{mode:<10} {stats['ttft']['p50_ms']:<15.2f} {stats['ttft']['p95_ms']:<15.2f} "
+              f"{stats['avg_time_ms']:<15.2f} {stats['avg_tokens_per_sec']:<12.2f}")
+
+
+def print_cache_comparison(summary: dict):
+    """In phân phối latency cold vs warm cạnh nhau theo từng mode"""
+    if not any("cache" in stats for stats in summary.values()):
+        return
+    
+    print("\n" + "="*100)
+    print("🧊🔥 COLD-CACHE vs WARM-CACHE")
+    print("="*100)
+    print("(cold / warm đo với stream=False để warm hit cache câu trả lời)")
+    
+    print(f"\n{'Mode':<10} {'Cold p50':<11} {'Cold p95':<11} {'Cold mean':<11} "
+          f"{'Warm p50':<11} {'Warm p95':<11} {'Warm mean':<11} {'Speedup':<10}")
+    print("-"*100)
+    
+    for mode, stats in summary.items():
+        cold = stats["cache"].get("cold")
+        warm = stats["cache"].get("warm")
+        cells = []
+        for dist in (cold, warm):
+            if dist:
+                cells.append(f"{dist['p50_ms']:<11.2f} {dist['p95_ms']:<11.2f} {dist['mean_ms']:<11.2f}")
+            else:
+                cells.append(f"{'-':<11} {'-':<11} {'-':<11}")
+        speedup = stats.get("cache_speedup")
+        speedup_str = f"{speedup:.2f}x" if speedup else "-"
+        print(f"{mode:<10} {cells[0]} {cells[1]} {speedup_str:<10}")
+
+
+async def run_benchmark(args):
     """Chạy benchmark đầy đủ"""
     print("\n" + "="*100)
     print("🚀 LightRAG Benchmark - Vietnamese Query Performance")
@@ -261,8 +548,21 @@ async def run_benchmark():
     print(f"\nModel: {LLM_MODEL}")
     print(f"Embedding: {EMBEDDING_MODEL_NAME}")
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Memory mode: {args.memory_mode}")
+    print(f"Warm-up: {args.warmup} | Repeat: {args.repeat} | Cache state: {args.cache_state}")
+    print(f"Profile: {args.profile or 'off'}")
+    print(f"Streaming runs: {'on' if args.stream else 'off'} (cold/warm luôn stream=False)")
+    print(f"Vector storage: {args.vector_storage}")
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    profiler = MemoryProfiler(mode=args.memory_mode, top_n=args.memory_top_n)
+    profiler.start()
+    cpu_profiler = Profiler(args.profile, output_dir=BENCHMARK_RESULTS_DIR, run_id=timestamp)
     
-    rag = await initialize_rag()
+    with profiler.measure("initialize_storages", phase=True):
+        rag = await initialize_rag(args.vector_storage)
+    profiler.record_storage_resident(WORKING_DIR)
     
     try:
         # Dữ liệu mẫu
@@ -290,7 +590,8 @@ async def run_benchmark():
         
         print("\n📥 Inserting data...")
         insert_start = time.perf_counter()
-        await rag.ainsert(sample_texts)
+        with profiler.measure("insert", phase=True), cpu_profiler.profile("insert"):
+            await rag.ainsert(sample_texts)
         insert_time = (time.perf_counter() - insert_start) * 1000
         print(f"✓ Insert completed in {insert_time:.2f}ms")
         
@@ -301,10 +602,17 @@ async def run_benchmark():
             "Ngành AI phát triển như thế nào tại Việt Nam?",
         ]
         
+        ann_recall = []
+        if args.vector_storage == "HnswVectorStorage":
+            ann_recall = await measure_ann_recall(rag, queries, args.ann_sample)
+            print_ann_recall(ann_recall)
+        
         modes = ["naive", "local", "global", "hybrid"]
         all_results = []
         
-        print(f"\n🎯 Running {len(queries)} queries x {len(modes)} modes = {len(queries) * len(modes)} total queries...")
+        runs_per_pair = args.repeat * ((2 if args.cache_state == "both" else 1) + (1 if args.stream else 0))
+        print(f"\n🎯 Running {len(queries)} queries x {len(modes)} modes x {runs_per_pair} runs "
+              f"= {len(queries) * len(modes) * runs_per_pair} measured queries...")
         
         for i, query in enumerate(queries, 1):
             print(f"\n{'='*100}")
@@ -313,9 +621,12 @@ async def run_benchmark():
             
             for mode in modes:
                 print(f"  Testing {mode}...", end=" ")
-                result = await benchmark_query(rag, query, mode)
-                all_results.append(result)
-                print(f"✓ {result.execution_time_ms:.2f}ms")
+                with cpu_profiler.profile(f"query_{mode}"):
+                    results = await run_query_repetitions(rag, query, mode, profiler, args)
+                all_results.extend(results)
+                print("✓ " + ", ".join(
+                    f"{r.cache_state}#{r.repetition} {r.execution_time_ms:.2f}ms" for r in results
+                ))
         
         # In kết quả
         print_benchmark_table(all_results)
@@ -323,17 +634,32 @@ async def run_benchmark():
         # Tạo và in summary
         summary = generate_summary(all_results)
         print_summary_table(summary)
+        print_streaming_table(summary)
+        print_cache_comparison(summary)
+        print_memory_profile(profiler.to_dict())
+        print_profile_summary(cpu_profiler)
+        
+        emb_stats = embedding_adapter.report()
+        print(f"\n🧮 Embedding: {emb_stats['texts']} texts / {emb_stats['batches']} batches "
+              f"(avg {emb_stats['avg_batch_texts']} texts/batch), {emb_stats['texts_per_sec']} texts/sec, "
+              f"queue wait {emb_stats['queue_wait_seconds']:.3f}s")
+        print_llm_stats(llm_client.report())
         
         # Lưu báo cáo JSON
         report = BenchmarkReport(
             model_name=LLM_MODEL,
             embedding_model=EMBEDDING_MODEL_NAME,
-            total_queries=len(queries) * len(modes),
+            total_queries=len(all_results),
+            vector_storage=args.vector_storage,
+            ann_recall=ann_recall,
             results=[asdict(r) for r in all_results],
             summary=summary,
+            memory_profile=profiler.to_dict(),
+            cpu_profile=cpu_profiler.summary(),
+            embedding_stats=embedding_adapter.report(),
+            llm_stats=llm_client.report(),
         )
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         report_file = os.path.join(BENCHMARK_RESULTS_DIR, f"benchmark_report_{timestamp}.json")
         
         with open(report_file, 'w', encoding='utf-8') as f:
@@ -341,13 +667,66 @@ async def run_benchmark():
         
         print(f"\n💾 Report saved to: {report_file}")
         
+        for profile_file in cpu_profiler.write():
+            print(f"🔬 Profile saved to: {profile_file}")
+        
     finally:
         await rag.finalize_storages()
+        await llm_client.aclose()
+        profiler.stop()
     
     print("\n" + "="*100)
     print("✅ Benchmark completed!")
     print("="*100)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="LightRAG Vietnamese Benchmark")
+    parser.add_argument(
+        "--memory-mode", choices=MEMORY_MODES, default="rss",
+        help="rss: RSS delta (rẻ, nhiễu); tracemalloc: peak allocation + top allocation sites",
+    )
+    parser.add_argument(
+        "--memory-top-n", type=int, default=10,
+        help="Số allocation sites ghi vào báo cáo cho mỗi query (chế độ tracemalloc)",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1,
+        help="Số lần chạy warm-up (không đo) cho mỗi cặp (query, mode)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Số lần đo cho mỗi cặp (query, mode) và mỗi cache state",
+    )
+    parser.add_argument(
+        "--cache-state", choices=CACHE_STATES, default="both",
+        help="cold: xoá cache query/keywords của mode trước mỗi lần đo; warm: đo khi cache đã nạp; both: cả hai",
+    )
+    parser.add_argument(
+        "--no-stream", dest="stream", action="store_false",
+        help="Bỏ các lần đo streaming (TTFT / tokens/sec); các lần cold / warm luôn dùng stream=False "
+             "vì LightRAG chỉ cache câu trả lời không streaming",
+    )
+    parser.add_argument(
+        "--profile", nargs="?", const="sampling", choices=PROFILE_MODES, default=None,
+        help="Profile CPU theo từng mode và insert: sampling (collapsed stack) hoặc cprofile (.prof)",
+    )
+    parser.add_argument(
+        "--vector-storage", default=VECTOR_STORAGE,
+        help="Vector storage của LightRAG: NanoVectorDBStorage, MmapVectorStorage, HnswVectorStorage "
+             "(mặc định VECTOR_STORAGE)",
+    )
+    parser.add_argument(
+        "--ann-sample", type=int, default=200,
+        help="HnswVectorStorage: số vector đã lưu dùng thêm làm query khi đo recall@k so với tìm chính xác",
+    )
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat phải >= 1")
+    if args.warmup < 0:
+        parser.error("--warmup phải >= 0")
+    return args
+
+
 if __name__ == "__main__":
-    asyncio.run(run_benchmark())
+    asyncio.run(run_benchmark(parse_args()))
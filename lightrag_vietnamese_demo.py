@@ -15,23 +15,40 @@ Cách chạy:
 2. Hoặc ghi đè model qua environment variable:
    export LLM_MODEL="other-model-name"
    python lightrag_vietnamese_demo.py
+
+3. Vector storage memory-mapped (khởi động nhanh với working dir lớn):
+   VECTOR_STORAGE=MmapVectorStorage python lightrag_vietnamese_demo.py
+
+4. Profile CPU theo từng mode và insert (ghi vào ./benchmark_results):
+   python lightrag_vietnamese_demo.py --profile            # sampling, file .collapsed
+   python lightrag_vietnamese_demo.py --profile cprofile   # file .prof
 """
 
 import os
+import time
 import asyncio
+import argparse
 import numpy as np
+from datetime import datetime
 from typing import Literal, cast
 from openai import AsyncOpenAI
 from lightrag import LightRAG, QueryParam
-from lightrag.llm.openai import openai_complete_if_cache
 from lightrag.utils import wrap_embedding_func_with_attrs, setup_logger
 from sentence_transformers import SentenceTransformer
+from profiling_hooks import Profiler, PROFILE_MODES, print_profile_summary
+from query_cache import SemanticQueryCache, cached_aquery
+from embedding_adapter import BatchingEmbeddingAdapter
+from timing_spans import span, timed
+from llm_client import PooledLLMClient, AdaptiveLimiter, print_llm_stats
+from mmap_vector_storage import register_vector_storages
 
 # Cấu hình logging
 setup_logger("lightrag", level="INFO")
 
 # Thư mục làm việc
 WORKING_DIR = "./lightrag_vietnamese_storage"
+# Thư mục ghi profile (dùng chung với benchmark)
+BENCHMARK_RESULTS_DIR = "./benchmark_results"
 
 # Tạo thư mục nếu chưa tồn tại
 if not os.path.exists(WORKING_DIR):
@@ -44,6 +61,40 @@ LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://10.8.0.8:8000/v1")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "not-needed")
 LLM_MODEL = os.getenv("LLM_MODEL", "Qwen3-Coder-30B-A3B-Instruct")
 
+# Pool kết nối keep-alive + concurrency tự điều chỉnh (AIMD) theo tải của server LLM
+# MAX_ASYNC là concurrency khởi điểm; limiter tăng tới LLM_MAX_CONCURRENCY khi latency
+# còn phẳng và giảm khi timeout / 429 / 503
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+llm_client = PooledLLMClient(
+    LLM_BASE_URL, LLM_API_KEY,
+    AdaptiveLimiter(
+        initial=int(os.getenv("MAX_ASYNC", "4")),
+        min_concurrency=LLM_MIN_CONCURRENCY,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+    ),
+    timeout=LLM_TIMEOUT,
+)
+
+# Stream câu trả lời từ LLM (giảm thời gian chờ cảm nhận của người dùng)
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+
+# ============================================
+# Cấu hình Query Cache (exact + near-duplicate)
+# ============================================
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0.92"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+# ============================================
+# Vector storage
+# ============================================
+# NanoVectorDBStorage (mặc định của LightRAG, file JSON) hoặc MmapVectorStorage
+# (memmap nhị phân - khởi động nhanh, ít RSS, append không ghi lại toàn bộ)
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "NanoVectorDBStorage")
+register_vector_storages()
+
 # Khởi tạo OpenAI client để kiểm tra models
 openai_client = AsyncOpenAI(base_url=LLM_BASE_URL, api_key=LLM_API_KEY)
 
@@ -105,31 +156,43 @@ print(f"Đang tải model embedding: {EMBEDDING_MODEL_NAME}...")
 embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 print(f"✓ Model embedding đã tải xong!")
 
+# Text dài hơn cửa sổ của model: "none" (model tự cắt), "mean" / "max" (tách câu + pool)
+# ⚠️ Đổi pooling sau khi đã insert documents sẽ làm vector cũ/mới không đồng nhất
+EMBEDDING_POOLING = os.getenv("EMBEDDING_POOLING", "none")
+EMBEDDING_WINDOW_TOKENS = int(os.getenv("EMBEDDING_WINDOW_TOKENS", "200"))
+
+# Encode trên worker thread + gộp các lệnh gọi đồng thời thành batch
+embedding_adapter = BatchingEmbeddingAdapter(
+    embedding_model,
+    pooling=None if EMBEDDING_POOLING == "none" else EMBEDDING_POOLING,
+    window_tokens=EMBEDDING_WINDOW_TOKENS,
+)
+
 
 async def llm_model_func(
     prompt, system_prompt=None, history_messages=[], keyword_extraction=False, **kwargs
 ) -> str:
     """
-    Hàm gọi Local LLM qua OpenAI API
+    Hàm gọi Local LLM qua OpenAI API (client dùng chung, concurrency do llm_client điều chỉnh)
     """
-    return await openai_complete_if_cache(
+    return await llm_client.complete(
         LLM_MODEL,
         prompt,
         system_prompt=system_prompt,
         history_messages=history_messages,
-        api_key=LLM_API_KEY,
-        base_url=LLM_BASE_URL,
         **kwargs,
     )
 
 
+@timed("embedding")
 async def vietnamese_embedding_func(texts: list[str]) -> np.ndarray:
     """
     Hàm tạo embedding tiếng Việt sử dụng sentence-transformers
+    
+    Không block event loop: encode chạy trên worker thread của embedding_adapter
     """
     # SentenceTransformer trả về numpy array với shape (batch_size, embedding_dim)
-    embeddings = embedding_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-    return embeddings
+    return await embedding_adapter(texts)
 
 
 # Wrap embedding function với metadata
@@ -142,13 +205,18 @@ async def embedding_func(texts: list[str]) -> np.ndarray:
     return await vietnamese_embedding_func(texts)
 
 
-async def initialize_rag():
-    """Khởi tạo LightRAG instance"""
+async def initialize_rag(working_dir: str | None = None):
+    """Khởi tạo LightRAG instance (working_dir mặc định: WORKING_DIR)"""
     rag = LightRAG(
-        working_dir=WORKING_DIR,
+        working_dir=working_dir or WORKING_DIR,
         llm_model_func=llm_model_func,
         llm_model_name=LLM_MODEL,
+        # Không để LightRAG giới hạn thấp hơn limiter của llm_client
+        llm_model_max_async=LLM_MAX_CONCURRENCY,
+        # LightRAG huỷ lệnh gọi LLM sau 2 x default_llm_timeout - khớp với timeout của llm_client
+        default_llm_timeout=int(LLM_TIMEOUT),
         embedding_func=embedding_func,
+        vector_storage=VECTOR_STORAGE,
         # Tùy chọn: cấu hình ngôn ngữ và entity types
         addon_params={
             "language": "Vietnamese",  # Ngôn ngữ cho entity/relation extraction
@@ -181,7 +249,7 @@ async def test_embedding():
     return embeddings.shape[1]
 
 
-async def demo_insert_and_query():
+async def demo_insert_and_query(profiler: Profiler):
     """Demo insert và query dữ liệu tiếng Việt"""
     
     print("\n" + "="*60)
@@ -191,6 +259,13 @@ async def demo_insert_and_query():
     # Khởi tạo RAG
     rag = await initialize_rag()
     
+    # Front cache cho query (dùng chính embedding function tiếng Việt để tìm câu hỏi gần trùng)
+    query_cache = SemanticQueryCache(
+        embedding_func,
+        similarity_threshold=QUERY_CACHE_SIMILARITY,
+        ttl_seconds=QUERY_CACHE_TTL,
+    ) if QUERY_CACHE_ENABLED else None
+    
     try:
         # Văn bản mẫu tiếng Việt
         sample_texts = """
@@ -216,7 +291,11 @@ async def demo_insert_and_query():
         """
         
         print("\nĐang insert dữ liệu...")
-        await rag.ainsert(sample_texts)
+        with profiler.profile("insert"), span("ainsert", filename="sample_texts"):
+            await rag.ainsert(sample_texts)
+        if query_cache is not None:
+            # Dữ liệu mới => kết quả đã cache không còn đúng
+            query_cache.invalidate()
         print("✓ Insert hoàn tất!")
         
         # Test các mode query khác nhau
@@ -228,7 +307,13 @@ async def demo_insert_and_query():
         
         modes = ["naive", "local", "global", "hybrid"]
         
-        for query in queries:
+        # Các câu hỏi gần trùng (khác cách diễn đạt) - sẽ hit query cache
+        near_duplicate_queries = [
+            "Hà Nội có các địa điểm nổi tiếng nào?",
+            "công ty công nghệ nào lớn nhất ở Việt Nam",
+        ]
+        
+        for query in queries + near_duplicate_queries:
             print(f"\n{'='*60}")
             print(f"Câu hỏi: {query}")
             print('='*60)
@@ -237,25 +322,46 @@ async def demo_insert_and_query():
                 mode_literal = cast(Literal["naive", "local", "global", "hybrid"], mode)
                 print(f"\n--- Query mode: {mode} ---")
                 try:
-                    resp = await rag.aquery(
-                        query,
-                        param=QueryParam(mode=mode_literal, stream=False)
-                    )
-                    if hasattr(resp, '__iter__') and not isinstance(resp, str):
-                        async for chunk in resp:
-                            print(chunk, end="", flush=True)
-                    else:
-                        resp_str = str(resp)
-                        print(resp_str[:500] + "..." if len(resp_str) > 500 else resp_str)
+                    param = QueryParam(mode=mode_literal, stream=STREAM_RESPONSES)
+                    with profiler.profile(f"query_{mode}"):
+                        start_time = time.perf_counter()
+                        if query_cache is not None:
+                            resp = await cached_aquery(rag, query_cache, query, param)
+                        else:
+                            resp = await rag.aquery(query, param=param)
+                        
+                        if hasattr(resp, '__aiter__'):
+                            # Streaming: in từng chunk ngay khi LLM sinh ra
+                            ttft = None
+                            async for chunk in resp:
+                                if chunk and ttft is None:
+                                    ttft = time.perf_counter() - start_time
+                                print(chunk, end="", flush=True)
+                            total = time.perf_counter() - start_time
+                            print(f"\n[TTFT: {(ttft or total) * 1000:.0f}ms | Tổng: {total * 1000:.0f}ms]")
+                        else:
+                            resp_str = str(resp)
+                            print(resp_str[:500] + "..." if len(resp_str) > 500 else resp_str)
                 except Exception as e:
                     print(f"Lỗi trong mode {mode}: {e}")
+        
+        if query_cache is not None:
+            stats = query_cache.report()
+            print(f"\n{'='*60}")
+            print("QUERY CACHE")
+            print('='*60)
+            print(f"  - Lookups: {stats['lookups']}")
+            print(f"  - Exact hits: {stats['exact_hits']}")
+            print(f"  - Near-duplicate hits: {stats['semantic_hits']}")
+            print(f"  - Hit rate: {stats['hit_rate']:.1%}")
+            print(f"  - Latency tiết kiệm: {stats['saved_latency_s']:.2f}s")
                     
     finally:
         # Đóng storage
         await rag.finalize_storages()
 
 
-async def main():
+async def main(args):
     """Hàm chính"""
     print("\n" + "="*60)
     print("LightRAG Demo với Local LLM và Vietnamese Embedding")
@@ -270,17 +376,41 @@ async def main():
     print(f"  - Embedding: {EMBEDDING_MODEL_NAME}")
     print(f"  - Embedding Dim: {EMBEDDING_DIM}")
     print(f"  - Working Dir: {WORKING_DIR}")
+    print(f"  - Vector Storage: {VECTOR_STORAGE}")
 
     # Test embedding trước
     await test_embedding()
 
     # Demo insert và query
-    await demo_insert_and_query()
+    profiler = Profiler(
+        args.profile, output_dir=BENCHMARK_RESULTS_DIR,
+        run_id=datetime.now().strftime("%Y%m%d_%H%M%S"), prefix="demo_profile",
+    )
+    await demo_insert_and_query(profiler)
+    
+    stats = embedding_adapter.report()
+    print(f"\nEmbedding: {stats['texts']} texts / {stats['batches']} batches "
+          f"(avg {stats['avg_batch_texts']} texts/batch), {stats['texts_per_sec']} texts/sec")
+    print_llm_stats(llm_client.report())
+    await llm_client.aclose()
+    
+    print_profile_summary(profiler)
+    for profile_file in profiler.write():
+        print(f"Profile đã lưu: {profile_file}")
 
     print("\n" + "="*60)
     print("Demo hoàn tất!")
     print("="*60)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="LightRAG Vietnamese Demo")
+    parser.add_argument(
+        "--profile", nargs="?", const="sampling", choices=PROFILE_MODES, default=None,
+        help="Profile CPU theo từng mode và insert: sampling (collapsed stack) hoặc cprofile (.prof)",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
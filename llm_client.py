@@ -0,0 +1,355 @@
+"""
+LLM client dùng chung cho LightRAG - connection pool keep-alive + adaptive concurrency
+
+openai_complete_if_cache tạo (và đóng) một AsyncOpenAI client mới cho mỗi lệnh gọi,
+concurrency thì cố định theo MAX_ASYNC bất kể server LLM đang tải ra sao. Module này:
+- giữ một httpx.AsyncClient (keep-alive, pool kích thước max_concurrency) cho mọi request
+- AdaptiveLimiter kiểu AIMD:
+    * tăng +1 slot sau mỗi "cửa sổ" (limit request thành công) khi latency còn phẳng
+    * giảm -1 khi latency tăng vượt latency_tolerance x baseline
+    * giảm nhân (x backoff_factor) khi timeout hoặc HTTP 429/502/503/504
+- tự retry với exponential backoff (tôn trọng Retry-After) như openai_complete_if_cache:
+  overload, lỗi kết nối (socket keep-alive bị đóng / reset) và response rỗng; chỉ retry
+  khi lần thử tiếp theo (delay + timeout) còn nằm trong total_timeout của lệnh gọi
+  (mặc định 2 x timeout = thời gian LightRAG huỷ lệnh gọi LLM với default_llm_timeout=timeout)
+- report(): concurrency đang chọn, thời gian chờ trong hàng đợi, latency, số lần tăng/giảm
+
+Latency được chuẩn hoá theo số token sinh ra (giây/token) khi có usage, vì độ dài câu
+trả lời của extraction / query khác nhau rất nhiều. Câu trả lời ngắn (< MIN_NORMALIZE_TOKENS)
+hoặc không có usage dùng giây thô, với baseline / EWMA riêng (không trộn hai đơn vị).
+
+Sử dụng:
+    llm_client = PooledLLMClient(LLM_BASE_URL, LLM_API_KEY, AdaptiveLimiter(initial=4, max_concurrency=16))
+
+    async def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
+        return await llm_client.complete(LLM_MODEL, prompt, system_prompt, history_messages, **kwargs)
+
+    rag = LightRAG(..., llm_model_func=llm_model_func,
+                   llm_model_max_async=llm_client.limiter.max_concurrency,
+                   default_llm_timeout=int(llm_client.timeout))
+"""
+
+import time
+import random
+import asyncio
+import httpx
+import numpy as np
+from collections import deque
+from contextlib import asynccontextmanager
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+
+# Status code coi là server quá tải -> giảm concurrency
+OVERLOAD_STATUS_CODES = (429, 502, 503, 504)
+
+# kwargs LightRAG truyền vào llm_model_func nhưng không thuộc OpenAI API
+LIGHTRAG_ONLY_KWARGS = ("hashing_kv", "keyword_extraction", "enable_cot", "token_tracker", "openai_client_configs")
+
+# Số mẫu giữ lại để tính percentile / baseline
+STATS_WINDOW = 500
+
+# Ít token hơn thì latency/token không có ý nghĩa - dùng giây thô (baseline riêng)
+MIN_NORMALIZE_TOKENS = 8
+
+
+class InvalidResponseError(Exception):
+    """Response không có nội dung - retry như openai_complete_if_cache"""
+
+
+def is_overload(error: BaseException) -> bool:
+    """Timeout hoặc 429/5xx quá tải"""
+    if isinstance(error, (APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in OVERLOAD_STATUS_CODES
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Overload, lỗi kết nối hoặc response rỗng (lỗi kết nối không giảm concurrency)"""
+    return is_overload(error) or isinstance(
+        error, (APIConnectionError, httpx.TransportError, InvalidResponseError)
+    )
+
+
+def _retry_after(error: BaseException) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _percentile_ms(values, q: float) -> float:
+    values = np.asarray(values, dtype=float)
+    return round(float(np.percentile(values, q)) * 1000, 2) if values.size else 0.0
+
+
+class _Outcome:
+    """Kết quả một request trong slot - tokens dùng để chuẩn hoá latency"""
+
+    def __init__(self):
+        self.tokens = 0
+
+
+class AdaptiveLimiter:
+    """Giới hạn số request LLM đồng thời, tự điều chỉnh theo AIMD"""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        latency_tolerance: float = 1.5,
+        backoff_factor: float = 0.5,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(max_concurrency, min_concurrency)
+        self.limit = min(max(initial, min_concurrency), self.max_concurrency)
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition: asyncio.Condition | None = None
+        self._window_successes = 0
+        # Theo đơn vị: "per_token" (giây/token) và "seconds" (giây thô)
+        self._latency_ewma: dict[str, float] = {}
+        self._signals = {"per_token": deque(maxlen=STATS_WINDOW), "seconds": deque(maxlen=STATS_WINDOW)}
+        self._last_backoff = 0.0
+        self._started_at = time.perf_counter()
+
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "overloads": 0,
+            "increases": 0,
+            "decreases": 0,
+            "queue_wait_seconds": 0.0,
+        }
+        self._queue_waits = deque(maxlen=STATS_WINDOW)
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self.trace = deque(maxlen=200)
+        self._record("start")
+
+    def _record(self, reason: str):
+        self.trace.append((round(time.perf_counter() - self._started_at, 3), self.limit, reason))
+
+    def _baseline(self, unit: str) -> float | None:
+        """Latency "không tải": percentile thấp của các mẫu gần đây cùng đơn vị"""
+        signals = self._signals[unit]
+        if len(signals) < 5:
+            return None
+        return float(np.percentile(np.asarray(signals, dtype=float), 10))
+
+    async def _acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        start = time.perf_counter()
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+        waited = time.perf_counter() - start
+        self.stats["queue_wait_seconds"] += waited
+        self._queue_waits.append(waited)
+
+    async def _release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _on_success(self, latency: float, tokens: int):
+        self._latencies.append(latency)
+        if tokens >= MIN_NORMALIZE_TOKENS:
+            unit, signal = "per_token", latency / tokens
+        else:
+            unit, signal = "seconds", latency
+        baseline = self._baseline(unit)
+        self._signals[unit].append(signal)
+        ewma = self._latency_ewma.get(unit)
+        ewma = self._latency_ewma[unit] = signal if ewma is None else 0.8 * ewma + 0.2 * signal
+
+        # Mỗi cửa sổ `limit` request thành công mới đánh giá lại một lần
+        self._window_successes += 1
+        if baseline is None or self._window_successes < self.limit:
+            return
+        self._window_successes = 0
+
+        if ewma > baseline * self.latency_tolerance:
+            if self.limit > self.min_concurrency:
+                self.limit -= 1
+                self.stats["decreases"] += 1
+                self._record("latency")
+        elif self.in_flight + self.waiting >= self.limit and self.limit < self.max_concurrency:
+            # Chỉ tăng khi đang dùng hết slot (tăng lúc rảnh không cho thông tin gì)
+            self.limit += 1
+            self.stats["increases"] += 1
+            self._record("increase")
+
+    def _on_overload(self):
+        self.stats["overloads"] += 1
+        self._window_successes = 0
+        # Một đợt lỗi từ cùng một burst chỉ giảm một lần
+        now = time.perf_counter()
+        cooldown = max(1.0, float(np.median(self._latencies)) if self._latencies else 1.0)
+        if now - self._last_backoff < cooldown:
+            return
+        self._last_backoff = now
+        new_limit = max(self.min_concurrency, int(self.limit * self.backoff_factor))
+        if new_limit < self.limit:
+            self.limit = new_limit
+            self.stats["decreases"] += 1
+            self._record("overload")
+
+    @asynccontextmanager
+    async def slot(self):
+        """Giữ một slot trong lúc gọi LLM; ghi latency / lỗi khi kết thúc"""
+        await self._acquire()
+        outcome = _Outcome()
+        started = time.perf_counter()
+        self.stats["requests"] += 1
+        try:
+            yield outcome
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            if is_overload(e):
+                self._on_overload()
+            raise
+        else:
+            self._on_success(time.perf_counter() - started, outcome.tokens)
+        finally:
+            await self._release()
+
+    def report(self) -> dict:
+        requests = self.stats["requests"]
+        baseline = self._baseline("per_token")
+        if baseline is None:
+            baseline = self._baseline("seconds")
+        return {
+            "concurrency": self.limit,
+            "min_concurrency": self.min_concurrency,
+            "max_concurrency": self.max_concurrency,
+            "peak_concurrency": max(limit for _, limit, _ in self.trace),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.stats,
+            "queue_wait_seconds": round(self.stats["queue_wait_seconds"], 4),
+            "avg_queue_wait_ms": round(self.stats["queue_wait_seconds"] / requests * 1000, 2) if requests else 0.0,
+            "queue_wait_p95_ms": _percentile_ms(self._queue_waits, 95),
+            "latency_p50_ms": _percentile_ms(self._latencies, 50),
+            "latency_p95_ms": _percentile_ms(self._latencies, 95),
+            "latency_baseline": round(baseline, 6) if baseline is not None else None,
+            "trace": list(self.trace),
+        }
+
+
+class PooledLLMClient:
+    """AsyncOpenAI client dùng chung (keep-alive) đặt sau AdaptiveLimiter"""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        limiter: AdaptiveLimiter | None = None,
+        timeout: float = 300.0,
+        max_retries: int = 3,
+        total_timeout: float | None = None,
+    ):
+        self.limiter = limiter or AdaptiveLimiter()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Ngân sách cho cả lệnh complete() kể cả retry - LightRAG huỷ lệnh gọi LLM sau
+        # 2 x default_llm_timeout
+        self.total_timeout = total_timeout if total_timeout is not None else 2 * timeout
+        self.retries = 0
+        pool_size = self.limiter.max_concurrency
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        # Retry tự làm ở complete() để limiter thấy được 429/503
+        self.client = AsyncOpenAI(
+            base_url=base_url, api_key=api_key, http_client=self.http_client, max_retries=0,
+        )
+
+    async def complete(
+        self, model: str, prompt: str, system_prompt: str | None = None,
+        history_messages: list | None = None, **kwargs,
+    ):
+        """
+        Tương thích openai_complete_if_cache: trả về str, hoặc async iterator
+        các đoạn text khi stream=True (không retry khi stream)
+        """
+        for name in LIGHTRAG_ONLY_KWARGS:
+            kwargs.pop(name, None)
+        stream = kwargs.pop("stream", False)
+
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.extend(history_messages or [])
+        messages.append({"role": "user", "content": prompt})
+
+        if stream:
+            return self._stream(model, messages, kwargs)
+
+        attempt = 0
+        deadline = time.monotonic() + self.total_timeout
+        while True:
+            try:
+                async with self.limiter.slot() as outcome:
+                    response = await self.client.chat.completions.create(
+                        model=model, messages=messages, **kwargs,
+                    )
+                    if not response.choices or not response.choices[0].message.content:
+                        raise InvalidResponseError("Received empty content from LLM API")
+                    if response.usage:
+                        outcome.tokens = response.usage.completion_tokens or 0
+                return response.choices[0].message.content
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e) or 0.5 * 2 ** attempt * (1 + random.random())
+                # Lần thử tiếp theo có thể mất tới timeout: không retry nếu vượt ngân sách
+                # (vd: timeout ở lần đầu) - caller huỷ giữa chừng cũng vô ích
+                if time.monotonic() + delay + self.timeout > deadline:
+                    raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def _stream(self, model: str, messages: list, kwargs: dict):
+        # Slot được giữ tới khi stream kết thúc (server vẫn đang sinh token)
+        async with self.limiter.slot() as outcome:
+            response = await self.client.chat.completions.create(
+                model=model, messages=messages, stream=True, **kwargs,
+            )
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    outcome.tokens += 1
+                    yield content
+
+    def report(self) -> dict:
+        return {**self.limiter.report(), "retries": self.retries}
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+def print_llm_stats(stats: dict):
+    """In concurrency đã chọn và thời gian chờ"""
+    print(f"\n🔌 LLM: concurrency {stats['concurrency']} "
+          f"(min {stats['min_concurrency']}, max {stats['max_concurrency']}, peak {stats['peak_concurrency']}) | "
+          f"{stats['requests']} requests, {stats['overloads']} overloads, {stats['retries']} retries | "
+          f"queue wait avg {stats['avg_queue_wait_ms']:.1f}ms, p95 {stats['queue_wait_p95_ms']:.1f}ms | "
+          f"latency p50 {stats['latency_p50_ms']:.0f}ms, p95 {stats['latency_p95_ms']:.0f}ms")
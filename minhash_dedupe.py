@@ -0,0 +1,122 @@
+"""
+Phát hiện văn bản gần trùng lặp (near-duplicate) bằng MinHash + LSH
+
+- Chuẩn hoá văn bản tiếng Việt: Unicode NFC, chữ thường, bỏ dấu câu; giữ dấu thanh
+  (bỏ dấu sẽ làm "bán"/"bàn"/"bạn" trùng nhau)
+- Shingle theo cụm `shingle_words` âm tiết liên tiếp (tiếng Việt viết tách âm tiết)
+- MinHash `num_perm` hàm hash, LSH chia `bands` băng để tìm ứng viên, sau đó xác nhận
+  bằng Jaccard ước lượng >= threshold
+
+Sử dụng:
+    index = MinHashIndex(threshold=0.85)
+    signature = index.signature(text)
+    duplicate_of, similarity = index.query(signature)
+    if duplicate_of is None:
+        index.add("inputs/a.pdf", signature)
+"""
+
+import re
+import hashlib
+import unicodedata
+import numpy as np
+from collections import defaultdict
+
+# Số nguyên tố Mersenne 2^61 - 1 cho hàm hash (a*x + b) mod p
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Số shingle mỗi lần tính permutation: ma trận tạm chunk x num_perm (4096 x 128 uint64 = 4 MB)
+_SIGNATURE_CHUNK = 4096
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> list[str]:
+    """Âm tiết đã chuẩn hoá (NFC, chữ thường, bỏ dấu câu)"""
+    return _WORD_PATTERN.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def shingles(text: str, shingle_words: int = 3) -> set[str]:
+    words = normalize_text(text)
+    if len(words) <= shingle_words:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+
+
+class MinHashIndex:
+    """Chỉ mục LSH trong bộ nhớ cho chữ ký MinHash"""
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 32,
+                 shingle_words: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) phải chia hết cho bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._buckets: dict[tuple, set[str]] = defaultdict(set)
+        self._signatures: dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Chữ ký MinHash (num_perm giá trị uint32)"""
+        items = shingles(text, self.shingle_words)
+        if not items:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items],
+            dtype=np.uint64,
+        )
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _SIGNATURE_CHUNK):
+            chunk = hashes[start:start + _SIGNATURE_CHUNK]
+            # a, x <= 2^32 - 1 nên a*x < 2^64; lấy mod p trước khi cộng b (< 2^32) để tổng
+            # luôn < 2^62, không phụ thuộc vào biên của a / b / x
+            permuted = (np.outer(chunk, self._a) % _MERSENNE_PRIME + self._b) % _MERSENNE_PRIME & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Jaccard ước lượng giữa hai chữ ký"""
+        return float(np.mean(a == b))
+
+    def query(self, signature: np.ndarray) -> tuple[str | None, float]:
+        """Tài liệu gần trùng nhất có similarity >= threshold (None nếu không có)"""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates |= self._buckets.get(key, set())
+        best, best_similarity = None, 0.0
+        for key in candidates:
+            sim = self.similarity(signature, self._signatures[key])
+            if sim > best_similarity:
+                best, best_similarity = key, sim
+        if best_similarity >= self.threshold:
+            return best, best_similarity
+        return None, best_similarity
+
+    def add(self, key: str, signature: np.ndarray):
+        self.remove(key)
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].add(key)
+
+    def remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
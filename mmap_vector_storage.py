@@ -0,0 +1,609 @@
+"""
+Vector storage memory-mapped cho LightRAG (MmapVectorStorage)
+
+NanoVectorDBStorage lưu toàn bộ vector + metadata trong một file JSON (vdb_*.json):
+initialize_storages() phải parse cả file, bộ nhớ giữ cả cấu trúc đã parse lẫn ma trận,
+và mỗi lần flush lại ghi lại toàn bộ file. Với vài trăm nghìn vector 768 chiều, khởi
+động mất phần lớn thời gian cho JSON. MmapVectorStorage tách thành các file nhị phân:
+
+    mmap_vdb_<namespace>.header.json        dim, dtype, số dòng đã commit, generation
+    mmap_vdb_<namespace>.<gen>.vec          ma trận float32/float16 (np.memmap, đã chuẩn hoá L2)
+    mmap_vdb_<namespace>.<gen>.ids          bảng ID gọn: "P<TAB>id<TAB>row<TAB>offset<TAB>length"
+                                            hoặc "D<TAB>id" (tombstone), append-only
+    mmap_vdb_<namespace>.<gen>.meta.jsonl   metadata (content, file_path, ...) append-only,
+                                            chỉ đọc theo offset khi cần (get_by_id, kết quả query)
+
+- Khởi động: đọc header + bảng ID (không parse JSON metadata, không nạp vector vào RAM)
+- upsert: append vector vào cuối memmap, append một dòng ID + một dòng metadata
+  (upsert ID đã có = append dòng mới và đánh tombstone dòng cũ)
+- index_done_callback: flush phần đã append và ghi header - không ghi lại toàn bộ
+- Nạp / nạp lại chỉ đọc phần đã commit (ids_bytes / meta_bytes trong header), không bao giờ
+  cắt file: tiến trình khác có thể đang append. Phần đuôi chưa commit (tiến trình dừng trước
+  index_done_callback) chỉ bị cắt trước lần ghi đầu tiên, khi đang giữ namespace lock
+- Khi tombstone vượt COMPACT_RATIO số dòng: compaction sang generation mới, đổi header
+  (atomic), xoá generation cũ
+- Lần đầu chạy trên working dir đang dùng NanoVectorDBStorage: tự import vdb_*.json
+
+Cấu hình:
+    VECTOR_STORAGE=MmapVectorStorage
+    MMAP_VECTOR_DTYPE=float32|float16     (mặc định float32; float16 giảm một nửa dung lượng
+                                          nhưng query chậm hơn vì phải đổi sang float32 theo block;
+                                          dữ liệu đã có giữ nguyên dtype)
+
+Sử dụng:
+    from mmap_vector_storage import register_vector_storages
+    register_vector_storages()
+    rag = LightRAG(..., vector_storage="MmapVectorStorage")
+"""
+
+import os
+import glob
+import json
+import time
+import base64
+import zlib
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+import numpy as np
+
+from lightrag.base import BaseVectorStorage
+from lightrag.utils import logger, compute_mdhash_id
+from lightrag.kg.shared_storage import (
+    get_namespace_lock,
+    get_update_flag,
+    set_all_update_flags,
+)
+
+MMAP_VECTOR_DTYPES = ("float32", "float16")
+
+# Số dòng tối thiểu cấp phát trước cho file vector (sau đó tăng gấp đôi)
+GROW_ROWS = 4096
+# Số dòng đổi sang float32 mỗi lần khi tính similarity (giới hạn bộ nhớ tạm)
+QUERY_BLOCK_ROWS = 65536
+# Compaction khi số dòng tombstone >= max(COMPACT_MIN_TOMBSTONES, COMPACT_RATIO * rows)
+COMPACT_MIN_TOMBSTONES = 1000
+COMPACT_RATIO = 0.3
+
+# Các storage của package, đăng ký vào lightrag.kg bằng register_vector_storages()
+VECTOR_STORAGE_MODULES = {
+    "MmapVectorStorage": "mmap_vector_storage",
+    "HnswVectorStorage": "hnsw_vector_storage",
+}
+
+
+def register_vector_storages():
+    """Đăng ký storage của package vào registry của LightRAG (gọi trước khi tạo LightRAG)"""
+    from lightrag import kg
+
+    implementations = kg.STORAGE_IMPLEMENTATIONS["VECTOR_STORAGE"]["implementations"]
+    for name, module in VECTOR_STORAGE_MODULES.items():
+        kg.STORAGES[name] = module
+        kg.STORAGE_ENV_REQUIREMENTS.setdefault(name, [])
+        if name not in implementations:
+            implementations.append(name)
+
+
+def _link_field(value) -> str:
+    """src_id / tgt_id trong bảng ID (không chứa tab / xuống dòng)"""
+    return str(value).replace("\t", " ").replace("\n", " ").replace("\r", " ")
+
+
+@dataclass
+class MmapVectorStorage(BaseVectorStorage):
+    def __post_init__(self):
+        self._validate_embedding_func()
+        kwargs = self.global_config.get("vector_db_storage_cls_kwargs", {})
+        cosine_threshold = kwargs.get("cosine_better_than_threshold")
+        if cosine_threshold is None:
+            raise ValueError(
+                "cosine_better_than_threshold must be specified in vector_db_storage_cls_kwargs"
+            )
+        self.cosine_better_than_threshold = cosine_threshold
+
+        working_dir = self.global_config["working_dir"]
+        if self.workspace:
+            workspace_dir = os.path.join(working_dir, self.workspace)
+        else:
+            workspace_dir = working_dir
+            self.workspace = ""
+        os.makedirs(workspace_dir, exist_ok=True)
+
+        self._base_path = os.path.join(workspace_dir, f"mmap_vdb_{self.namespace}")
+        self._header_file = self._base_path + ".header.json"
+        self._nano_file = os.path.join(workspace_dir, f"vdb_{self.namespace}.json")
+        self._dim = self.embedding_func.embedding_dim
+        self._default_dtype = kwargs.get("mmap_vector_dtype") or os.getenv("MMAP_VECTOR_DTYPE", "float32")
+        if self._default_dtype not in MMAP_VECTOR_DTYPES:
+            raise ValueError(f"MMAP_VECTOR_DTYPE không hợp lệ: {self._default_dtype} (chọn {MMAP_VECTOR_DTYPES})")
+        self._max_batch_size = self.global_config["embedding_batch_num"]
+
+        self._storage_lock = None
+        self.storage_updated = None
+        self._vectors = None
+        self._ids_writer = None
+        self._meta_writer = None
+        self._meta_fd = None
+        self._tail_trimmed = False
+        self._load()
+
+    async def initialize(self):
+        """Initialize storage data"""
+        self.storage_updated = await get_update_flag(self.namespace, workspace=self.workspace)
+        self._storage_lock = get_namespace_lock(self.namespace, workspace=self.workspace)
+
+    async def finalize(self):
+        self._close()
+
+    # ---------- file layout ----------
+
+    def _paths(self, generation: int) -> tuple[str, str, str]:
+        prefix = f"{self._base_path}.{generation}"
+        return prefix + ".vec", prefix + ".ids", prefix + ".meta.jsonl"
+
+    def _read_header(self) -> dict | None:
+        if not os.path.exists(self._header_file):
+            return None
+        with open(self._header_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_header(self, generation: int, rows: int, ids_bytes: int, meta_bytes: int):
+        tmp_path = self._header_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self._dim, "dtype": self._dtype.name, "generation": generation,
+                "rows": rows, "ids_bytes": ids_bytes, "meta_bytes": meta_bytes,
+            }, f)
+        os.replace(tmp_path, self._header_file)
+
+    # ---------- load ----------
+
+    def _close(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        for writer in (self._ids_writer, self._meta_writer):
+            if writer is not None:
+                writer.close()
+        if self._meta_fd is not None:
+            os.close(self._meta_fd)
+        self._ids_writer = self._meta_writer = self._meta_fd = None
+
+    def _load(self):
+        """Nạp header + bảng ID; vector ở lại trên đĩa (memmap)"""
+        self._close()
+        self._alive = None
+        header = self._read_header()
+        if header is not None and header["dim"] != self._dim:
+            raise ValueError(
+                f"{self._header_file}: dim {header['dim']} khác embedding_dim {self._dim}"
+            )
+
+        self._dtype = np.dtype(header["dtype"] if header else self._default_dtype)
+        self._generation = header["generation"] if header else 0
+        self._rows = header["rows"] if header else 0
+        vector_path, ids_path, meta_path = self._paths(self._generation)
+
+        self._committed_bytes = {
+            ids_path: header["ids_bytes"] if header else 0,
+            meta_path: header["meta_bytes"] if header else 0,
+        }
+        # Chưa cắt phần đuôi chưa commit - _trim_uncommitted() trước lần ghi đầu tiên
+        self._tail_trimmed = False
+
+        self._ids: list[str | None] = [None] * self._rows
+        self._row_of: dict[str, int] = {}
+        self._meta_ref: dict[str, tuple[int, int]] = {}
+        self._links: dict[str, tuple[str, str]] = {}
+        committed_ids = b""
+        if os.path.exists(ids_path):
+            with open(ids_path, "rb") as f:
+                committed_ids = f.read(self._committed_bytes[ids_path])
+        if committed_ids:
+            for line in committed_ids.decode("utf-8").split("\n"):
+                if not line:
+                    continue
+                parts = line.split("\t")
+                if parts[0] == "P":
+                    self._set_row(parts[1], int(parts[2]), int(parts[3]), int(parts[4]))
+                    if len(parts) == 7:
+                        self._links[parts[1]] = (parts[5], parts[6])
+                elif parts[0] == "D":
+                    self._unset(parts[1])
+
+        self._open_vectors(vector_path, self._rows)
+        self._alive[:self._rows] = [id_ is not None for id_ in self._ids]
+        self._open_writers()
+        self._meta_dirty = False
+
+        if header is None and os.path.exists(self._nano_file):
+            self._import_nano_vectordb()
+
+    def _open_writers(self):
+        _, ids_path, meta_path = self._paths(self._generation)
+        for writer in (self._ids_writer, self._meta_writer):
+            if writer is not None:
+                writer.close()
+        if self._meta_fd is not None:
+            os.close(self._meta_fd)
+        self._ids_writer = open(ids_path, "ab")
+        self._meta_writer = open(meta_path, "ab")
+        self._meta_fd = os.open(meta_path, os.O_RDONLY)
+
+    def _trim_uncommitted(self):
+        """
+        Cắt phần đã append nhưng chưa commit (tiến trình dừng trước index_done_callback)
+        trước lần ghi đầu tiên sau khi nạp. Gọi khi giữ namespace lock (upsert / delete)
+        hoặc lúc import ban đầu - không gọi từ đường đọc / nạp lại.
+        """
+        if self._tail_trimmed:
+            return
+        trimmed = False
+        for path, committed in self._committed_bytes.items():
+            if os.path.getsize(path) != committed:
+                with open(path, "ab") as f:
+                    f.truncate(committed)
+                trimmed = True
+        if trimmed:
+            # Vị trí ghi / tell() của writer đang mở không còn đúng
+            self._open_writers()
+        self._tail_trimmed = True
+
+    def _open_vectors(self, path: str, min_rows: int):
+        row_bytes = self._dim * self._dtype.itemsize
+        file_rows = os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+        capacity = max(file_rows, min_rows, GROW_ROWS)
+        if file_rows < capacity:
+            # Mở rộng file (sparse) - không ghi dữ liệu
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._vector_path = path
+        self._vectors = np.memmap(path, dtype=self._dtype, mode="r+", shape=(capacity, self._dim))
+        alive = np.zeros(capacity, dtype=bool)
+        if self._alive is not None:
+            n = min(len(self._alive), capacity)
+            alive[:n] = self._alive[:n]
+        self._alive = alive
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= len(self._vectors):
+            return
+        capacity = max(len(self._vectors) * 2, rows)
+        self._vectors.flush()
+        self._vectors = None
+        with open(self._vector_path, "ab") as f:
+            f.truncate(capacity * self._dim * self._dtype.itemsize)
+        self._open_vectors(self._vector_path, capacity)
+
+    def _import_nano_vectordb(self):
+        """Import một lần từ vdb_<namespace>.json của NanoVectorDBStorage"""
+        with open(self._nano_file, "r", encoding="utf-8") as f:
+            storage = json.load(f)
+        entries = storage.get("data", [])
+        if not entries:
+            return
+        if storage.get("matrix"):
+            matrix = np.frombuffer(base64.b64decode(storage["matrix"]), dtype=np.float32).reshape(-1, self._dim)
+        else:
+            matrix = np.stack([
+                np.frombuffer(zlib.decompress(base64.b64decode(e["vector"])), dtype=np.float16) for e in entries
+            ]).astype(np.float32)
+        metas = {
+            e["__id__"]: {k: v for k, v in e.items() if k not in ("__id__", "vector", "__vector__")}
+            for e in entries
+        }
+        self._append(metas, matrix)
+        self._commit()
+        logger.info(f"[{self.workspace}] Imported {len(entries)} vectors from {self._nano_file} into {self.namespace}")
+
+    # ---------- in-memory id table ----------
+
+    def _set_row(self, id_: str, row: int, offset: int, length: int):
+        old_row = self._row_of.get(id_)
+        if old_row is not None:
+            self._ids[old_row] = None
+            if self._alive is not None:
+                self._alive[old_row] = False
+        if row >= len(self._ids):
+            self._ids.extend([None] * (row + 1 - len(self._ids)))
+        self._ids[row] = id_
+        self._row_of[id_] = row
+        self._meta_ref[id_] = (offset, length)
+
+    def _unset(self, id_: str) -> bool:
+        row = self._row_of.pop(id_, None)
+        if row is None:
+            return False
+        self._ids[row] = None
+        if self._alive is not None:
+            self._alive[row] = False
+        self._meta_ref.pop(id_, None)
+        self._links.pop(id_, None)
+        return True
+
+    @property
+    def _tombstones(self) -> int:
+        return self._rows - len(self._row_of)
+
+    def _append(self, metas: dict[str, dict], vectors: np.ndarray):
+        """Append vector (chuẩn hoá L2) + dòng metadata + dòng ID"""
+        self._trim_uncommitted()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        start = self._rows
+        self._ensure_capacity(start + len(vectors))
+        self._vectors[start:start + len(vectors)] = (vectors / norms).astype(self._dtype)
+
+        id_lines = []
+        for i, (id_, meta) in enumerate(metas.items()):
+            line = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+            offset = self._meta_writer.tell()
+            self._meta_writer.write(line + b"\n")
+            row = start + i
+            self._set_row(id_, row, offset, len(line))
+            self._alive[row] = True
+            record = f"P\t{id_}\t{row}\t{offset}\t{len(line)}"
+            if "src_id" in meta and "tgt_id" in meta:
+                link = (_link_field(meta["src_id"]), _link_field(meta["tgt_id"]))
+                self._links[id_] = link
+                record += f"\t{link[0]}\t{link[1]}"
+            id_lines.append(record + "\n")
+        self._ids_writer.write("".join(id_lines).encode("utf-8"))
+        self._rows = start + len(vectors)
+        self._meta_dirty = True
+
+    def _read_meta(self, id_: str) -> dict | None:
+        ref = self._meta_ref.get(id_)
+        if ref is None:
+            return None
+        if self._meta_dirty:
+            self._meta_writer.flush()
+            self._meta_dirty = False
+        return json.loads(os.pread(self._meta_fd, ref[1], ref[0]))
+
+    def _record(self, id_: str) -> dict | None:
+        meta = self._read_meta(id_)
+        if meta is None:
+            return None
+        return {**meta, "__id__": id_, "id": id_, "created_at": meta.get("__created_at__")}
+
+    def _commit(self):
+        """Flush phần đã append rồi ghi header (điểm commit)"""
+        if not self._tail_trimmed:
+            # Không ghi gì từ lần nạp cuối: không có gì để commit (không đụng phần đuôi
+            # chưa commit của tiến trình khác)
+            return
+        self._vectors.flush()
+        for writer in (self._meta_writer, self._ids_writer):
+            writer.flush()
+            os.fsync(writer.fileno())
+        self._meta_dirty = False
+        ids_bytes, meta_bytes = self._ids_writer.tell(), self._meta_writer.tell()
+        self._write_header(self._generation, self._rows, ids_bytes, meta_bytes)
+        _, ids_path, meta_path = self._paths(self._generation)
+        self._committed_bytes = {ids_path: ids_bytes, meta_path: meta_bytes}
+
+    def _compact(self):
+        """Ghi các dòng còn sống sang generation mới, đổi header, xoá generation cũ"""
+        live = [(row, id_) for row, id_ in enumerate(self._ids[:self._rows]) if id_ is not None]
+        old_generation = self._generation
+        generation = self._generation + 1
+        vector_path, ids_path, meta_path = self._paths(generation)
+
+        capacity = max(len(live), GROW_ROWS)
+        with open(vector_path, "wb") as f:
+            f.truncate(capacity * self._dim * self._dtype.itemsize)
+        vectors = np.memmap(vector_path, dtype=self._dtype, mode="r+", shape=(capacity, self._dim))
+        rows = np.fromiter((row for row, _ in live), dtype=np.int64, count=len(live))
+        for start in range(0, len(live), QUERY_BLOCK_ROWS):
+            block = rows[start:start + QUERY_BLOCK_ROWS]
+            vectors[start:start + len(block)] = self._vectors[block]
+        vectors.flush()
+        del vectors
+
+        if self._meta_dirty:
+            self._meta_writer.flush()
+        offset = 0
+        with open(meta_path, "wb") as meta_out, open(ids_path, "wb") as ids_out:
+            for new_row, (_, id_) in enumerate(live):
+                old_offset, length = self._meta_ref[id_]
+                meta_out.write(os.pread(self._meta_fd, length, old_offset) + b"\n")
+                record = f"P\t{id_}\t{new_row}\t{offset}\t{length}"
+                if id_ in self._links:
+                    record += "\t" + "\t".join(self._links[id_])
+                ids_out.write((record + "\n").encode("utf-8"))
+                offset += length + 1
+            meta_out.flush()
+            os.fsync(meta_out.fileno())
+            ids_out.flush()
+            os.fsync(ids_out.fileno())
+            ids_bytes = ids_out.tell()
+
+        self._write_header(generation, len(live), ids_bytes, offset)
+        self._load()
+        # Mọi file của generation cũ (kể cả file phụ của lớp con, vd: index HNSW)
+        for path in glob.glob(glob.escape(f"{self._base_path}.{old_generation}.") + "*"):
+            os.remove(path)
+        logger.info(f"[{self.workspace}] Compacted {self.namespace}: {len(live)} live vectors")
+
+    def _reload_if_updated(self):
+        """Nạp lại (chỉ phần đã commit) nếu tiến trình khác đã cập nhật storage - gọi khi giữ lock"""
+        if self.storage_updated.value:
+            logger.info(
+                f"[{self.workspace}] Process {os.getpid()} reloading {self.namespace} due to update by another process"
+            )
+            self._load()
+            self.storage_updated.value = False
+
+    async def _check_reload(self):
+        async with self._storage_lock:
+            self._reload_if_updated()
+
+    # ---------- BaseVectorStorage ----------
+
+    async def upsert(self, data: dict[str, dict[str, Any]]) -> None:
+        if not data:
+            return
+
+        current_time = int(time.time())
+        metas = {
+            k: {
+                "__created_at__": current_time,
+                **{k1: v1 for k1, v1 in v.items() if k1 in self.meta_fields},
+            }
+            for k, v in data.items()
+        }
+        contents = [v["content"] for v in data.values()]
+        batches = [
+            contents[i : i + self._max_batch_size]
+            for i in range(0, len(contents), self._max_batch_size)
+        ]
+        embeddings = np.concatenate(await asyncio.gather(*[self.embedding_func(batch) for batch in batches]))
+        if len(embeddings) != len(metas):
+            logger.error(
+                f"[{self.workspace}] embedding is not 1-1 with data, {len(embeddings)} != {len(metas)}"
+            )
+            return
+
+        async with self._storage_lock:
+            self._reload_if_updated()
+            self._append(metas, embeddings)
+
+    def _similarities(self, embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity với mọi dòng (dòng đã xoá = -inf)"""
+        scores = np.empty(self._rows, dtype=np.float32)
+        for start in range(0, self._rows, QUERY_BLOCK_ROWS):
+            block = np.asarray(self._vectors[start:start + QUERY_BLOCK_ROWS][:self._rows - start], dtype=np.float32)
+            scores[start:start + len(block)] = block @ embedding
+        scores[~self._alive[:self._rows]] = -np.inf
+        return scores
+
+    @staticmethod
+    def _normalize_query(embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    async def _embed_query(self, query: str, query_embedding) -> np.ndarray:
+        if query_embedding is None:
+            query_embedding = (await self.embedding_func([query], _priority=5))[0]
+        return self._normalize_query(query_embedding)
+
+    def _results(self, rows, scores) -> list[dict[str, Any]]:
+        results = []
+        for row, score in zip(rows, scores):
+            if score < self.cosine_better_than_threshold:
+                continue
+            id_ = self._ids[row]
+            record = self._record(id_) if id_ is not None else None
+            if record is not None:
+                results.append({**record, "distance": float(score)})
+        return results
+
+    def _search(self, embedding: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k (rows, cosine similarity) giảm dần - tìm chính xác trên toàn bộ ma trận"""
+        scores = self._similarities(embedding)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    async def query(
+        self, query: str, top_k: int, query_embedding: list[float] = None
+    ) -> list[dict[str, Any]]:
+        embedding = await self._embed_query(query, query_embedding)
+        await self._check_reload()
+        if not self._row_of or top_k <= 0:
+            return []
+
+        rows, scores = self._search(embedding, min(top_k, len(self._row_of)))
+        return self._results(rows, scores)
+
+    async def delete(self, ids: list[str]):
+        try:
+            async with self._storage_lock:
+                self._reload_if_updated()
+                deleted = [id_ for id_ in ids if self._unset(id_)]
+                if deleted:
+                    self._trim_uncommitted()
+                    self._ids_writer.write("".join(f"D\t{id_}\n" for id_ in deleted).encode("utf-8"))
+            logger.debug(f"[{self.workspace}] Successfully deleted {len(deleted)} vectors from {self.namespace}")
+        except Exception as e:
+            logger.error(f"[{self.workspace}] Error while deleting vectors from {self.namespace}: {e}")
+
+    async def delete_entity(self, entity_name: str) -> None:
+        entity_id = compute_mdhash_id(entity_name, prefix="ent-")
+        await self.delete([entity_id])
+
+    async def delete_entity_relation(self, entity_name: str) -> None:
+        await self._check_reload()
+        name = _link_field(entity_name)
+        ids_to_delete = [id_ for id_, (src, tgt) in self._links.items() if name in (src, tgt)]
+        logger.debug(f"[{self.workspace}] Found {len(ids_to_delete)} relations for entity {entity_name}")
+        if ids_to_delete:
+            await self.delete(ids_to_delete)
+
+    async def index_done_callback(self) -> bool:
+        """Flush phần append và ghi header (compaction khi nhiều tombstone)"""
+        async with self._storage_lock:
+            if self.storage_updated.value:
+                logger.warning(
+                    f"[{self.workspace}] Storage for {self.namespace} was updated by another process, reloading..."
+                )
+                self._load()
+                self.storage_updated.value = False
+                return False
+
+        async with self._storage_lock:
+            try:
+                # Chỉ tiến trình vừa ghi mới compaction (tiến trình chỉ đọc không đụng file)
+                if self._tail_trimmed and self._tombstones >= max(COMPACT_MIN_TOMBSTONES, COMPACT_RATIO * self._rows):
+                    self._commit()
+                    self._compact()
+                else:
+                    self._commit()
+                await set_all_update_flags(self.namespace, workspace=self.workspace)
+                self.storage_updated.value = False
+                return True
+            except Exception as e:
+                logger.error(f"[{self.workspace}] Error saving data for {self.namespace}: {e}")
+                return False
+
+    async def get_by_id(self, id: str) -> dict[str, Any] | None:
+        await self._check_reload()
+        return self._record(id)
+
+    async def get_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
+        if not ids:
+            return []
+        await self._check_reload()
+        return [self._record(id_) for id_ in ids]
+
+    async def get_vectors_by_ids(self, ids: list[str]) -> dict[str, list[float]]:
+        if not ids:
+            return {}
+        await self._check_reload()
+        return {
+            id_: self._vectors[self._row_of[id_]].astype(np.float32).tolist()
+            for id_ in ids if id_ in self._row_of
+        }
+
+    async def drop(self) -> dict[str, str]:
+        try:
+            async with self._storage_lock:
+                self._close()
+                for path in glob.glob(glob.escape(self._base_path) + ".*"):
+                    os.remove(path)
+                # Không import lại từ vdb_*.json sau khi drop
+                self._write_header(0, 0, 0, 0)
+                self._load()
+
+                await set_all_update_flags(self.namespace, workspace=self.workspace)
+                self.storage_updated.value = False
+                logger.info(
+                    f"[{self.workspace}] Process {os.getpid()} drop {self.namespace}(file:{self._header_file})"
+                )
+            return {"status": "success", "message": "data dropped"}
+        except Exception as e:
+            logger.error(f"[{self.workspace}] Error dropping {self.namespace}: {e}")
+            return {"status": "error", "message": str(e)}
@@ -0,0 +1,227 @@
+"""
+Profiler hooks cho demo và benchmark LightRAG
+
+Hai chế độ:
+- sampling: thread phụ lấy mẫu stack của event loop thread theo chu kỳ, ghi file
+            collapsed stack (tương thích flamegraph.pl / speedscope / inferno)
+- cprofile: cProfile deterministic, ghi file .prof (xem bằng snakeviz / pstats)
+
+Mỗi label (vd: "insert", "query_naive") được đo riêng:
+- wall time, CPU time toàn process, CPU time của event loop thread
+- tỉ lệ mẫu event loop đang chờ I/O (LLM API, embedding service)
+
+Sử dụng:
+    profiler = Profiler("sampling", output_dir="./benchmark_results", run_id="20250101_120000")
+    with profiler.profile("query_naive"):
+        await rag.aquery(...)
+    profiler.write()
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import cProfile
+import pstats
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+PROFILE_MODES = ("sampling", "cprofile")
+
+# Chu kỳ lấy mẫu mặc định (giây)
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Root frame cho các mẫu event loop đang chờ I/O trong selector
+IDLE_FRAME = "<io-wait>"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    """Event loop đang block trong selector.select() - tức là đang chờ I/O"""
+    code = frame.f_code
+    return code.co_name == "select" and code.co_filename.endswith("selectors.py")
+
+
+class _StackSampler(threading.Thread):
+    """Thread lấy mẫu stack của một thread khác (event loop thread)"""
+
+    def __init__(self, target_thread_id: int, loop, interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.target_thread_id = target_thread_id
+        self.loop = loop
+        self.interval = interval
+        self.label = None
+        self.stacks: dict[str, Counter] = defaultdict(Counter)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            label = self.label
+            if label is None:
+                continue
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+
+            if _is_idle(frame):
+                root = IDLE_FRAME
+            else:
+                try:
+                    task = asyncio.current_task(self.loop) if self.loop is not None else None
+                except RuntimeError:
+                    task = None
+                root = f"task:{task.get_name()}" if task is not None else "<loop>"
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(root)
+            stack.reverse()
+            self.stacks[label][";".join(stack)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Profiler theo label - gọi profile(label) nhiều lần với cùng label sẽ cộng dồn
+
+    mode=None: không profile (các hook trở thành no-op)
+    """
+
+    def __init__(self, mode: str | None, output_dir: str, run_id: str,
+                 prefix: str = "profile", interval: float = DEFAULT_SAMPLE_INTERVAL):
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Profile mode không hợp lệ: {mode} (chọn một trong {PROFILE_MODES})")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.run_id = run_id
+        self.prefix = prefix
+        self.interval = interval
+        self.timings: dict[str, dict] = defaultdict(
+            lambda: {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "loop_cpu_s": 0.0}
+        )
+        self._cprofiles: dict[str, cProfile.Profile] = {}
+        self._sampler: _StackSampler | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def _ensure_sampler(self):
+        if self._sampler is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            self._sampler = _StackSampler(threading.get_ident(), loop, self.interval)
+            self._sampler.start()
+
+    @contextmanager
+    def profile(self, label: str):
+        """Profile đoạn code bên trong (có thể chứa await) dưới tên label"""
+        if not self.enabled:
+            yield
+            return
+
+        profiler = None
+        if self.mode == "sampling":
+            self._ensure_sampler()
+            self._sampler.label = label
+        else:
+            profiler = self._cprofiles.setdefault(label, cProfile.Profile())
+            profiler.enable()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        loop_cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            timing = self.timings[label]
+            timing["calls"] += 1
+            timing["wall_s"] += time.perf_counter() - wall_start
+            timing["cpu_s"] += time.process_time() - cpu_start
+            timing["loop_cpu_s"] += time.thread_time() - loop_cpu_start
+
+            if profiler is not None:
+                profiler.disable()
+            else:
+                self._sampler.label = None
+
+    def summary(self) -> dict:
+        """Wall vs CPU theo label (và tỉ lệ mẫu chờ I/O với chế độ sampling)"""
+        result = {}
+        for label, timing in self.timings.items():
+            wall = timing["wall_s"]
+            entry = {
+                "calls": timing["calls"],
+                "wall_s": round(wall, 4),
+                "cpu_s": round(timing["cpu_s"], 4),
+                "loop_cpu_s": round(timing["loop_cpu_s"], 4),
+                "cpu_utilization": round(timing["cpu_s"] / wall, 3) if wall > 0 else 0.0,
+            }
+            if self._sampler is not None:
+                stacks = self._sampler.stacks.get(label, Counter())
+                total = sum(stacks.values())
+                idle = sum(n for s, n in stacks.items() if s.startswith(IDLE_FRAME))
+                entry["samples"] = total
+                entry["io_wait_fraction"] = round(idle / total, 3) if total else 0.0
+            result[label] = entry
+        return result
+
+    def write(self) -> list[str]:
+        """Dừng profiler và ghi file profile + summary JSON vào output_dir"""
+        if not self.enabled:
+            return []
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"{self.prefix}_{self.run_id}")
+        written = []
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            for label, stacks in self._sampler.stacks.items():
+                path = f"{base}_{label}.collapsed"
+                with open(path, "w", encoding="utf-8") as f:
+                    for stack, count in stacks.most_common():
+                        f.write(f"{stack} {count}\n")
+                written.append(path)
+
+        for label, profiler in self._cprofiles.items():
+            path = f"{base}_{label}.prof"
+            pstats.Stats(profiler).dump_stats(path)
+            written.append(path)
+
+        summary_path = f"{base}_summary.json"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "labels": self.summary()}, f, ensure_ascii=False, indent=2)
+        written.append(summary_path)
+
+        return written
+
+
+def print_profile_summary(profiler: Profiler):
+    """In bảng wall vs CPU theo label"""
+    if not profiler.enabled:
+        return
+
+    print("\n" + "="*100)
+    print(f"🔬 PROFILE SUMMARY (mode: {profiler.mode})")
+    print("="*100)
+    print(f"\n{'Label':<20} {'Calls':<8} {'Wall(s)':<10} {'CPU(s)':<10} {'Loop CPU(s)':<13} {'CPU util':<10} {'I/O wait':<10}")
+    print("-"*100)
+    for label, entry in profiler.summary().items():
+        io_wait = entry.get("io_wait_fraction")
+        io_wait_str = f"{io_wait:.1%}" if io_wait is not None else "-"
+        print(f"{label:<20} {entry['calls']:<8} {entry['wall_s']:<10.3f} {entry['cpu_s']:<10.3f} "
+              f"{entry['loop_cpu_s']:<13.3f} {entry['cpu_utilization']:<10.1%} {io_wait_str:<10}")
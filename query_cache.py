@@ -0,0 +1,224 @@
+"""
+Front cache cho kết quả query LightRAG
+
+- Exact match: key = (scope, query đã chuẩn hoá); scope = mode + hash các tham số QueryParam
+  ảnh hưởng câu trả lời (top_k, chunk_top_k, only_need_context, user_prompt,
+  conversation_history, ...)
+- Near-duplicate: cosine similarity giữa embedding của query mới và các query
+  đã cache (cùng scope), dùng chính Vietnamese embedding function của LightRAG
+- Không cache câu trả lời lỗi / fail_response "[no-context]" của LightRAG
+- TTL cho từng entry, invalidate toàn bộ khi insert document mới
+- Thống kê hit rate và latency tiết kiệm được
+
+Sử dụng:
+    cache = SemanticQueryCache(embedding_func, similarity_threshold=0.92, ttl_seconds=3600)
+    answer = await cached_aquery(rag, cache, "Hà Nội có gì nổi tiếng?", QueryParam(mode="hybrid"))
+    await rag.ainsert(text); cache.invalidate()
+"""
+
+import re
+import json
+import time
+import hashlib
+import dataclasses
+import unicodedata
+import numpy as np
+from dataclasses import dataclass, field
+
+from lightrag.prompt import PROMPTS
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Field QueryParam không đổi nội dung câu trả lời (cache hit vẫn trả về string khi stream)
+_SCOPE_IGNORED_FIELDS = ("stream", "model_func")
+_NO_CONTEXT_MARKER = "[no-context]"
+
+
+def normalize_query(text: str) -> str:
+    """
+    Chuẩn hoá query tiếng Việt: NFC, chữ thường, bỏ dấu câu, gộp khoảng trắng
+
+    Giữ nguyên dấu thanh - bỏ dấu sẽ làm trùng các từ khác nghĩa (vd: "ma" / "mã" / "mà").
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def query_scope(param) -> str:
+    """
+    Phần key cache ngoài query: mode + hash các field của QueryParam ảnh hưởng câu trả lời
+
+    Cùng query nhưng khác top_k / chunk_top_k / only_need_context / user_prompt /
+    conversation_history... là các entry khác nhau.
+    """
+    values = {
+        f.name: getattr(param, f.name)
+        for f in dataclasses.fields(param) if f.name not in _SCOPE_IGNORED_FIELDS
+    }
+    digest = hashlib.md5(
+        json.dumps(values, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"{param.mode}:{digest}"
+
+
+def is_cacheable_response(text: str) -> bool:
+    """Không cache response rỗng, lỗi hay fail_response (không tìm được context)"""
+    text = text.strip()
+    return bool(text) and text != PROMPTS["fail_response"] and _NO_CONTEXT_MARKER not in text
+
+
+@dataclass
+class CacheEntry:
+    """Một kết quả query đã cache"""
+    query: str
+    scope: str
+    response: str
+    latency_s: float
+    embedding: np.ndarray | None = None
+    created_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class CacheLookup:
+    """Kết quả tra cache: entry (nếu hit), loại hit và embedding của query để dùng lại khi put"""
+    entry: CacheEntry | None
+    kind: str  # "exact" | "semantic" | "miss"
+    similarity: float = 0.0
+    embedding: np.ndarray | None = None
+
+
+class SemanticQueryCache:
+    """Cache kết quả query theo (scope, query chuẩn hoá) + near-duplicate theo embedding"""
+
+    def __init__(
+        self,
+        embedding_func,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+    ):
+        self.embedding_func = embedding_func
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: dict[tuple[str, str], CacheEntry] = {}
+        self.stats = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "saved_latency_s": 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _is_expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if self._is_expired(e, now)]:
+            del self._entries[key]
+
+    async def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray((await self.embedding_func([query]))[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    async def get(self, query: str, scope: str) -> CacheLookup:
+        """Tra cache: exact match trước, sau đó near-duplicate theo cosine similarity"""
+        self.stats["lookups"] += 1
+        self._evict_expired()
+
+        entry = self._entries.get((scope, normalize_query(query)))
+        if entry is not None:
+            self.stats["exact_hits"] += 1
+            return CacheLookup(entry=entry, kind="exact", similarity=1.0)
+
+        embedding = await self._embed(query)
+        candidates = [e for (s, _), e in self._entries.items() if s == scope and e.embedding is not None]
+        if candidates:
+            similarities = np.stack([e.embedding for e in candidates]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold:
+                self.stats["semantic_hits"] += 1
+                return CacheLookup(
+                    entry=candidates[best], kind="semantic",
+                    similarity=float(similarities[best]), embedding=embedding,
+                )
+
+        self.stats["misses"] += 1
+        return CacheLookup(entry=None, kind="miss", embedding=embedding)
+
+    def put(self, query: str, scope: str, response: str, latency_s: float, embedding: np.ndarray | None = None):
+        """Lưu kết quả query (bỏ entry cũ nhất nếu vượt max_entries)"""
+        if len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k].created_at)
+            del self._entries[oldest]
+        self._entries[(scope, normalize_query(query))] = CacheEntry(
+            query=query, scope=scope, response=response, latency_s=latency_s, embedding=embedding,
+        )
+
+    def record_saved(self, entry: CacheEntry, lookup_latency_s: float):
+        """Cộng dồn latency tiết kiệm được = latency gốc của entry - thời gian tra cache"""
+        self.stats["saved_latency_s"] += max(entry.latency_s - lookup_latency_s, 0.0)
+
+    def invalidate(self):
+        """Xoá toàn bộ cache - gọi sau khi insert document mới"""
+        self._entries.clear()
+        self.stats["invalidations"] += 1
+
+    def report(self) -> dict:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "saved_latency_s": round(self.stats["saved_latency_s"], 3),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+async def _stream_and_cache(resp, cache: SemanticQueryCache, query: str, scope: str, start: float, embedding):
+    """Chuyển tiếp từng chunk cho caller, cache toàn bộ response khi stream kết thúc"""
+    chunks = []
+    async for chunk in resp:
+        chunks.append(chunk)
+        yield chunk
+    response_text = "".join(chunks)
+    if is_cacheable_response(response_text):
+        cache.put(query, scope, response_text, time.perf_counter() - start, embedding)
+
+
+async def cached_aquery(rag, cache: SemanticQueryCache, query: str, param):
+    """
+    rag.aquery() có front cache
+
+    - Cache hit: trả về string đã cache (kể cả khi param.stream=True)
+    - param.stream=True: trả về async iterator, response được cache khi stream kết thúc
+    - Ngược lại: trả về string
+
+    Lỗi, response rỗng hoặc fail_response "[no-context]" không được cache.
+    """
+    start = time.perf_counter()
+    scope = query_scope(param)
+    lookup = await cache.get(query, scope)
+    if lookup.entry is not None:
+        cache.record_saved(lookup.entry, time.perf_counter() - start)
+        return lookup.entry.response
+
+    resp = await rag.aquery(query, param=param)
+    if hasattr(resp, "__aiter__"):
+        if param.stream:
+            return _stream_and_cache(resp, cache, query, scope, start, lookup.embedding)
+        response_text = ""
+        async for chunk in resp:
+            response_text += chunk
+    else:
+        response_text = str(resp) if resp is not None else ""
+
+    if is_cacheable_response(response_text):
+        cache.put(query, scope, response_text, time.perf_counter() - start, lookup.embedding)
+    return response_text
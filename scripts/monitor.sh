@@ -1,8 +1,12 @@
 #!/bin/bash
 
 # Performance Monitoring Script for LightRAG
-# 
-# Usage: ./scripts/monitor.sh
+#
+# Đọc metrics Prometheus thay vì poll JSON + spawn python3:
+#   - Embedding service:  http://localhost:8001/metrics
+#   - LightRAG exporter:  http://localhost:9622/metrics  (python lightrag_exporter.py)
+#
+# Usage: ./scripts/monitor.sh [--watch]
 
 GREEN='\033[0;32m'
 YELLOW='\033[1;33m'
@@ -10,27 +14,51 @@ RED='\033[0;31m'
 BLUE='\033[0;34m'
 NC='\033[0m'
 
+EMBEDDING_METRICS_URL=${EMBEDDING_METRICS_URL:-http://localhost:8001/metrics}
+LIGHTRAG_METRICS_URL=${LIGHTRAG_METRICS_URL:-http://localhost:9622/metrics}
+
+# Lấy giá trị của một series (tên + labels đúng như trong exposition format)
+metric() {
+    echo "$1" | awk -v m="$2" '$1 == m { print $2; exit }'
+}
+
+# Trung bình của histogram: _sum / _count (ms)
+histogram_avg_ms() {
+    echo "$1" | awk -v s="$2_sum$3" -v c="$2_count$3" '
+        $1 == s { sum = $2 } $1 == c { count = $2 }
+        END { if (count > 0) printf "%.1f", sum / count * 1000; else print "-" }'
+}
+
 echo -e "${GREEN}============================================${NC}"
 echo -e "${GREEN}  LightRAG Performance Monitor${NC}"
 echo -e "${GREEN}============================================${NC}"
 echo ""
 
+emb_metrics=$(curl -s -m 3 "$EMBEDDING_METRICS_URL" 2>/dev/null)
+lr_metrics=$(curl -s -m 10 "$LIGHTRAG_METRICS_URL" 2>/dev/null)
+
 # Check services
 echo -e "${BLUE}=== SERVICES STATUS ===${NC}"
 
-# Embedding service
-if curl -s http://localhost:8001/health > /dev/null 2>&1; then
-    emb_data=$(curl -s http://localhost:8001/health)
-    device=$(echo $emb_data | python3 -c "import sys, json; print(json.load(sys.stdin).get('device', 'unknown'))")
+if [ -n "$emb_metrics" ]; then
+    if echo "$emb_metrics" | grep -q '^embedding_device_memory_bytes'; then
+        device="cuda"
+    else
+        device="cpu"
+    fi
     echo -e "${GREEN}✓${NC} Embedding Service: Running ($device)"
 else
     echo -e "${RED}✗${NC} Embedding Service: Not responding"
 fi
 
-# LightRAG
-if curl -s http://localhost:9621/health > /dev/null 2>&1; then
-    lr_data=$(curl -s http://localhost:9621/health)
-    pipeline=$(echo $lr_data | python3 -c "import sys, json; print('busy' if json.load(sys.stdin).get('pipeline_busy') else 'idle')")
+if [ -z "$lr_metrics" ]; then
+    echo -e "${RED}✗${NC} LightRAG Exporter: Not responding (python lightrag_exporter.py)"
+elif [ "$(metric "$lr_metrics" lightrag_up)" = "1.0" ]; then
+    if [ "$(metric "$lr_metrics" lightrag_pipeline_busy)" = "1.0" ]; then
+        pipeline="busy"
+    else
+        pipeline="idle"
+    fi
     echo -e "${GREEN}✓${NC} LightRAG Server: Running (pipeline: $pipeline)"
 else
     echo -e "${RED}✗${NC} LightRAG Server: Not responding"
@@ -38,42 +66,52 @@ fi
 
 echo ""
 
-# GPU Status
-echo -e "${BLUE}=== GPU STATUS ===${NC}"
-if command -v nvidia-smi &> /dev/null; then
-    nvidia-smi --query-gpu=name,utilization.gpu,memory.used,memory.total --format=csv,noheader | while read line; do
-        echo "GPU: $line"
+# Embedding service metrics
+echo -e "${BLUE}=== EMBEDDING SERVICE ===${NC}"
+if [ -n "$emb_metrics" ]; then
+    for priority in interactive bulk; do
+        requests=$(metric "$emb_metrics" "embedding_requests_total{priority=\"$priority\"}")
+        depth=$(metric "$emb_metrics" "embedding_queue_depth{priority=\"$priority\"}")
+        latency=$(histogram_avg_ms "$emb_metrics" embedding_request_seconds "{priority=\"$priority\"}")
+        encode=$(histogram_avg_ms "$emb_metrics" embedding_encode_seconds "{priority=\"$priority\"}")
+        printf "  %-12s requests: %-8s queue: %-6s avg latency: %6s ms  avg encode: %6s ms\n" \
+            "$priority" "${requests:-0}" "${depth:-0}" "$latency" "$encode"
     done
-    
-    echo ""
-    echo "GPU Processes:"
-    nvidia-smi --query-compute-apps=pid,name,used_memory --format=csv,noheader | head -5
+    hit_ratio=$(metric "$emb_metrics" embedding_cache_hit_ratio)
+    echo "  Cache hit ratio: ${hit_ratio:-0}"
+
+    allocated=$(metric "$emb_metrics" 'embedding_device_memory_bytes{kind="allocated"}')
+    reserved=$(metric "$emb_metrics" 'embedding_device_memory_bytes{kind="reserved"}')
+    if [ -n "$allocated" ]; then
+        awk -v a="$allocated" -v r="$reserved" \
+            'BEGIN { printf "  GPU memory: %.0f MiB allocated / %.0f MiB reserved\n", a / 1048576, r / 1048576 }'
+    fi
+    rss=$(metric "$emb_metrics" process_resident_memory_bytes)
+    if [ -n "$rss" ]; then
+        awk -v r="$rss" 'BEGIN { printf "  Process RSS: %.0f MiB\n", r / 1048576 }'
+    fi
 else
-    echo "nvidia-smi not available"
+    echo "Embedding metrics not available"
 fi
 
 echo ""
 
 # Documents Status
 echo -e "${BLUE}=== DOCUMENTS STATUS ===${NC}"
-doc_data=$(curl -s "http://localhost:9621/documents?limit=100" 2>/dev/null)
-if [ $? -eq 0 ]; then
-    total=$(echo $doc_data | python3 -c "import sys, json; print(json.load(sys.stdin).get('total', 0))")
+total=0
+processing=0
+if [ -n "$lr_metrics" ]; then
+    doc_lines=$(echo "$lr_metrics" | grep '^lightrag_documents{' | grep -v 'status="all"')
+    total=$(echo "$doc_lines" | awk '{ s += $2 } END { printf "%d", s }')
+    processing=$(echo "$doc_lines" | awk '/status="processing"/ { printf "%d", $2 }')
+    processing=${processing:-0}
     echo "Total documents: $total"
-    
-    if [ $total -gt 0 ]; then
+
+    if [ "$total" -gt 0 ]; then
         echo ""
         echo "Status breakdown:"
-        echo $doc_data | python3 -c "
-import sys, json
-data = json.load(sys.stdin)
-statuses = {}
-for doc in data.get('documents', []):
-    status = doc.get('status', 'unknown')
-    statuses[status] = statuses.get(status, 0) + 1
-for status, count in sorted(statuses.items()):
-    print(f'  {status}: {count}')
-"
+        echo "$doc_lines" | sed -E 's/^lightrag_documents\{status="([^"]*)"\} (.*)$/  \1: \2/' | \
+            awk '{ printf "  %s %d\n", $1, $2 }'
     fi
 else
     echo "Cannot fetch document status"
@@ -98,6 +136,7 @@ echo "Testing embedding speed..."
 start_time=$(date +%s%N)
 curl -s -X POST http://localhost:8001/v1/embeddings \
   -H "Content-Type: application/json" \
+  -H "X-Embedding-Priority: interactive" \
   -d '{"input": "Performance test sentence", "model": "vietnamese-embedding"}' > /dev/null 2>&1
 end_time=$(date +%s%N)
 elapsed=$(( (end_time - start_time) / 1000000 ))
@@ -108,25 +147,18 @@ echo ""
 # Recommendations
 echo -e "${BLUE}=== RECOMMENDATIONS ===${NC}"
 
-# Check if GPU is being used
-if command -v nvidia-smi &> /dev/null; then
-    gpu_util=$(nvidia-smi --query-gpu=utilization.gpu --format=csv,noheader,nounits | head -1 | tr -d ' ')
-    if [ "$gpu_util" -lt 10 ]; then
-        echo -e "${YELLOW}⚠${NC} GPU utilization is low (${gpu_util}%)"
-        echo "  - This is normal when idle"
-        echo "  - Should increase during document processing"
-    else
-        echo -e "${GREEN}✓${NC} GPU is active (${gpu_util}%)"
-    fi
+bulk_depth=$(metric "$emb_metrics" 'embedding_queue_depth{priority="bulk"}')
+bulk_depth=${bulk_depth%.*}
+if [ "${bulk_depth:-0}" -gt 0 ]; then
+    echo -e "${YELLOW}ℹ${NC} ${bulk_depth} bulk text(s) waiting for embedding"
+    echo "  - Normal during ingestion; queries are scheduled ahead of bulk batches"
+else
+    echo -e "${GREEN}✓${NC} Embedding queue is empty"
 fi
 
-# Check document processing
-if [ "$total" -gt 0 ]; then
-    processing=$(echo $doc_data | python3 -c "import sys, json; d=json.load(sys.stdin); print(sum(1 for doc in d.get('documents',[]) if doc.get('status')=='processing'))")
-    if [ "$processing" -gt 0 ]; then
-        echo -e "${YELLOW}ℹ${NC} $processing document(s) currently processing"
-        echo "  - Normal for large documents or high volume"
-    fi
+if [ "$processing" -gt 0 ]; then
+    echo -e "${YELLOW}ℹ${NC} $processing document(s) currently processing"
+    echo "  - Normal for large documents or high volume"
 fi
 
 echo ""
@@ -23,6 +23,12 @@ echo ""
 export LIGHTING_LOG_LEVEL=INFO
 export PYTHONUNBUFFERED=1
 
+# Timing spans (timing_spans.py) ghi vào file JSONL, xem bằng timing_report.py
+PACKAGE_DIR="$(cd "$(dirname "$0")/.." && pwd)"
+export TIMING_ENABLED=${TIMING_ENABLED:-true}
+export TIMING_LOG_FILE=${TIMING_LOG_FILE:-$PACKAGE_DIR/logs/file_processing_timings.jsonl}
+export TIMING_SAMPLE_RATE=${TIMING_SAMPLE_RATE:-1.0}
+
 # Change to LightRAG directory
 cd /root/lightRAG/LightRAG
 
@@ -43,6 +49,7 @@ echo "📊 Timing metrics will be logged with prefix: [TIMING]"
 echo "   - Upload API timing"
 echo "   - Docling conversion timing"
 echo "   - Background processing timing"
+echo "   - Spans: $TIMING_LOG_FILE (sample rate $TIMING_SAMPLE_RATE)"
 echo ""
 echo "=========================================="
 echo "Server starting... Wait for 'Ready' message"
@@ -50,7 +57,8 @@ echo "=========================================="
 echo ""
 
 # Start server with docling enabled and log to file with timestamps
-lightrag-server \
+# (launcher gắn timing spans rồi chạy entrypoint của lightrag-server)
+python "$PACKAGE_DIR/lightrag_server_with_timing.py" \
   --host 0.0.0.0 \
   --port 9621 \
   --working-dir /root/lightRAG/lightrag-vietnamese-package/rag_storage \
@@ -107,12 +107,21 @@ echo -e "${GREEN}✓${NC} LightRAG Server started"
     sleep 15
 fi
 
+# Start LightRAG metrics exporter (scrape http://localhost:9622/metrics)
+if check_port 9622; then
+    echo -e "${YELLOW}⚠${NC}  LightRAG Exporter already running on port 9622"
+else
+    python lightrag_exporter.py > logs/exporter.log 2>&1 &
+    echo -e "${GREEN}✓${NC} LightRAG Exporter started"
+fi
+
 # Cleanup function
 cleanup() {
     echo ""
     echo -e "${YELLOW}⚠${NC}  Shutting down services..."
     pkill -f "vietnamese_embedding_service" 2>/dev/null || true
     pkill -f "lightrag-server --docling" 2>/dev/null || true
+    pkill -f "lightrag_exporter" 2>/dev/null || true
     echo -e "${GREEN}✓${NC} Services stopped"
 }
 trap cleanup EXIT INT TERM
@@ -127,6 +136,7 @@ echo "Services:"
 echo "  - Vietnamese Embedding: http://localhost:8001 (GPU)"
 echo "  - LightRAG WebUI:       http://localhost:9621"
 echo "  - API Documentation:    http://localhost:9621/docs"
+echo "  - Metrics:              http://localhost:8001/metrics, http://localhost:9622/metrics"
 echo ""
 echo "Directories:"
 echo "  - Upload documents to: ./inputs/"
@@ -0,0 +1,52 @@
+"""Latency interactive của EmbeddingScheduler khi có backlog bulk kéo dài"""
+
+import time
+import asyncio
+import numpy as np
+
+from embedding_scheduler import EmbeddingScheduler
+
+ENCODE_SECONDS = 0.01
+
+
+def fake_embed(texts):
+    time.sleep(ENCODE_SECONDS)
+    return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+async def _interactive_latencies(scheduler, duration_s: float, interval_s: float) -> list[float]:
+    latencies = []
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await scheduler.submit(["câu hỏi"], "interactive")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval_s)
+    return latencies
+
+
+def test_interactive_latency_bounded_under_bulk_backlog():
+    async def run():
+        scheduler = EmbeddingScheduler(fake_embed, unit_texts=4, max_bulk_wait_s=0.1)
+        # ~200 unit bulk (~2s encode) - backlog cũ hơn max_bulk_wait_s trong suốt bài test
+        bulk = asyncio.create_task(scheduler.submit(["chunk"] * 800, "bulk"))
+        await asyncio.sleep(0.05)
+        latencies = await _interactive_latencies(scheduler, duration_s=0.8, interval_s=0.02)
+        bulk.cancel()
+        return latencies, scheduler
+
+    latencies, scheduler = asyncio.run(run())
+    # Tối đa: chờ một unit bulk đang chạy + một batch interactive (cộng dư cho máy chậm)
+    assert max(latencies) < 10 * ENCODE_SECONDS, f"max {max(latencies) * 1000:.0f}ms"
+    assert scheduler.report()["classes"]["bulk"]["batches"] > 0
+
+
+def test_bulk_still_served_while_interactive_keeps_arriving():
+    async def run():
+        scheduler = EmbeddingScheduler(fake_embed, unit_texts=4, starvation_limit=2, max_bulk_wait_s=10)
+        bulk = asyncio.create_task(scheduler.submit(["chunk"] * 40, "bulk"))
+        await asyncio.sleep(0)
+        await _interactive_latencies(scheduler, duration_s=0.5, interval_s=0.0)
+        return await asyncio.wait_for(bulk, timeout=2)
+
+    assert asyncio.run(run()).shape == (40, 4)
@@ -4,12 +4,15 @@ LightRAG File Processing Timing Report Generator
 Analyzes file_processing_timings.jsonl and generates reports
 """
 
+import os
 import json
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict
 
-TIMING_LOG_FILE = Path("/root/lightRAG/lightrag-vietnamese-package/logs/file_processing_timings.jsonl")
+TIMING_LOG_FILE = Path(os.getenv(
+    "TIMING_LOG_FILE", Path(__file__).resolve().parent / "logs" / "file_processing_timings.jsonl"
+))
 
 
 def load_timings():
@@ -95,6 +98,12 @@ def generate_report():
             dur_str = f"{duration:.2f}s" if isinstance(duration, (int, float)) else duration
             print(f"  {timestamp} | {event:<25} | {dur_str}")
             
+            if 'start_unix_time' in entry:
+                # Span từ timing_spans: một sự kiện chứa cả thời điểm bắt đầu và kết thúc
+                if start_time is None or entry['start_unix_time'] < start_time:
+                    start_time = entry['start_unix_time']
+                end_time = max(end_time or 0, entry['unix_time'])
+                continue
             if 'start' in event.lower() or event == 'processing_start':
                 if start_time is None:
                     start_time = entry['unix_time']
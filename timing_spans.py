@@ -0,0 +1,249 @@
+"""
+Timing spans cho pipeline ingestion - ghi logs/file_processing_timings.jsonl
+
+- span(event, filename=...): context manager (dùng được quanh await) đo thời gian
+- timed(event): decorator cho hàm sync / async
+- Sự kiện được đẩy vào buffer trong bộ nhớ; background thread ghi theo batch
+  (không ghi file đồng bộ trên mỗi sự kiện)
+- Sampling: TIMING_SAMPLE_RATE=0.1 chỉ ghi ~10% span
+
+Mỗi dòng JSONL tương thích với timing_report.py:
+    {"filename", "event", "timestamp", "unix_time", "start_unix_time", "duration_seconds", ...}
+
+Cấu hình qua environment:
+    TIMING_ENABLED=true|false           (mặc định false; lightrag_server_with_timing.py bật)
+    TIMING_LOG_FILE=logs/file_processing_timings.jsonl (cạnh module này)
+    TIMING_SAMPLE_RATE=1.0
+    TIMING_FLUSH_INTERVAL=1.0
+
+Sử dụng:
+    from timing_spans import span, timed
+
+    with span("docling_conversion", filename=path.name):
+        markdown = convert(path)
+
+    @timed("embedding")
+    async def embedding_func(texts): ...
+"""
+
+import os
+import json
+import time
+import random
+import atexit
+import functools
+import threading
+import inspect
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_TIMING_LOG_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "logs", "file_processing_timings.jsonl"
+)
+
+
+class TimingEmitter:
+    """Buffer sự kiện trong bộ nhớ và ghi theo batch từ background thread"""
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        flush_interval: float = 1.0,
+        max_buffer: int = 10000,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.enabled = enabled
+        self.dropped = 0
+        self.write_errors = 0
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._writer: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="timing-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.flush)
+
+    def sampled(self) -> bool:
+        """Quyết định sampling cho một span (gọi một lần ở đầu span)"""
+        return self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def emit(self, event: str, filename: str = "-", **fields):
+        """Đưa một sự kiện vào buffer (không ghi file trực tiếp)"""
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        now = time.time()
+        self._buffer.append({"filename": filename, "event": event, "unix_time": now, **fields})
+        self._ensure_writer()
+        if len(self._buffer) >= self.max_buffer // 2:
+            self._wakeup.set()
+
+    def _run(self):
+        failing = False
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Lỗi ghi file (đầy đĩa, không có quyền...) không được làm chết writer thread
+            try:
+                self.flush()
+                failing = False
+            except Exception as e:
+                self.write_errors += 1
+                if not failing:
+                    print(f"⚠️  [timing] cannot write {self.path}: {e} (events dropped: {self.dropped})")
+                failing = True
+
+    def flush(self):
+        """Ghi toàn bộ sự kiện đang buffer ra file"""
+        if not self._buffer:
+            return
+        lines = []
+        while self._buffer:
+            entry = self._buffer.popleft()
+            entry["timestamp"] = datetime.fromtimestamp(entry["unix_time"]).isoformat()
+            lines.append(json.dumps(entry, ensure_ascii=False))
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError:
+                self.dropped += len(lines)
+                raise
+
+    @contextmanager
+    def span(self, event: str, filename: str = "-", **attrs):
+        """Đo thời gian đoạn code bên trong; ghi một sự kiện khi kết thúc (kể cả khi lỗi)"""
+        if not self.sampled():
+            yield
+            return
+
+        start_wall = time.time()
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.emit(
+                event, filename,
+                start_unix_time=start_wall,
+                duration_seconds=round(time.perf_counter() - start, 6),
+                status=status,
+                **attrs,
+            )
+
+
+def _emitter_from_env() -> TimingEmitter:
+    return TimingEmitter(
+        path=os.getenv("TIMING_LOG_FILE", DEFAULT_TIMING_LOG_FILE),
+        sample_rate=float(os.getenv("TIMING_SAMPLE_RATE", "1.0")),
+        flush_interval=float(os.getenv("TIMING_FLUSH_INTERVAL", "1.0")),
+        enabled=os.getenv("TIMING_ENABLED", "false").lower() == "true",
+    )
+
+
+_emitter = _emitter_from_env()
+
+
+def get_emitter() -> TimingEmitter:
+    return _emitter
+
+
+def configure(**kwargs) -> TimingEmitter:
+    """Thay emitter mặc định (vd: configure(path=..., sample_rate=0.1))"""
+    global _emitter
+    _emitter.flush()
+    _emitter = TimingEmitter(**{
+        "path": _emitter.path,
+        "sample_rate": _emitter.sample_rate,
+        "flush_interval": _emitter.flush_interval,
+        "enabled": _emitter.enabled,
+        **kwargs,
+    })
+    return _emitter
+
+
+def span(event: str, filename: str = "-", **attrs):
+    """Span trên emitter mặc định"""
+    return _emitter.span(event, filename, **attrs)
+
+
+def timed(event: str, filename_arg: str | None = None):
+    """
+    Decorator đo thời gian hàm sync / async
+
+    filename_arg: tên tham số dùng làm filename trong sự kiện (vd: "file_path")
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def _filename(args, kwargs) -> str:
+            if filename_arg is None:
+                return "-"
+            value = signature.bind_partial(*args, **kwargs).arguments.get(filename_arg) or "-"
+            if isinstance(value, (list, tuple)):
+                extra = f" (+{len(value) - 1})" if len(value) > 1 else ""
+                return os.path.basename(str(value[0])) + extra if value else "-"
+            return os.path.basename(str(value))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _emitter.span(event, _filename(args, kwargs)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _emitter.span(event, _filename(args, kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def install_lightrag_hooks():
+    """
+    Gắn span vào LightRAG (gọi trước khi khởi động server / tạo LightRAG instance):
+    - document_routes._convert_with_docling   -> "docling_conversion"
+    - LightRAG.ainsert                        -> "ainsert"
+    - LightRAG.apipeline_process_enqueue_documents -> "pipeline_process"
+    - EmbeddingFunc.__call__                  -> "embedding" (mỗi batch embedding, gồm cả thời
+      gian chờ giới hạn embedding_func_max_async của LightRAG)
+    """
+    from lightrag import LightRAG
+    from lightrag.utils import EmbeddingFunc
+
+    LightRAG.ainsert = timed("ainsert", filename_arg="file_paths")(LightRAG.ainsert)
+    LightRAG.apipeline_process_enqueue_documents = timed("pipeline_process")(
+        LightRAG.apipeline_process_enqueue_documents
+    )
+    # Server tạo EmbeddingFunc của riêng nó - gắn vào class thay vì hàm embedding cụ thể
+    EmbeddingFunc.__call__ = timed("embedding")(EmbeddingFunc.__call__)
+
+    try:
+        from lightrag.api.routers import document_routes
+        if hasattr(document_routes, "_convert_with_docling"):
+            document_routes._convert_with_docling = timed("docling_conversion", filename_arg="file_path")(
+                document_routes._convert_with_docling
+            )
+    except ImportError:
+        pass
+
+    print(f"✓ Timing hooks installed -> {_emitter.path} (sample rate {_emitter.sample_rate})")
@@ -0,0 +1,131 @@
+"""
+Chia text tiếng Việt theo câu thành các cửa sổ vừa với embedding model
+
+Vấn đề: LightRAG chunk theo CHUNK_SIZE=1200 tokens, trong khi model
+dangvantuan/vietnamese-embedding chỉ nhận ~256 tokens (service truncate ở 200).
+Phần lớn mỗi chunk bị cắt bỏ trước khi embed.
+
+Giải pháp: tách chunk theo ranh giới câu thành các cửa sổ <= max_tokens, embed tất
+cả cửa sổ trong một batch rồi pool (mean / max) về một vector cho mỗi chunk.
+
+Sử dụng:
+    windows, owners = build_windows(texts, count_tokens, max_tokens=200)
+    vectors = model.encode(windows)
+    pooled = pool_windows(vectors, owners, len(texts), method="mean")
+"""
+
+import re
+import numpy as np
+
+POOLING_METHODS = ("mean", "max")
+
+# Viết tắt thường gặp kết thúc bằng dấu chấm - không phải ranh giới câu
+VIETNAMESE_ABBREVIATIONS = {
+    "tp", "q", "p", "tx", "tt", "ths", "ts", "pgs", "gs", "bs", "ks", "cn",
+    "ubnd", "hđnd", "v.v", "vv", "st", "mr", "mrs", "dr", "no", "tr", "đ",
+}
+
+# Dấu kết thúc câu, theo sau là khoảng trắng; hoặc xuống dòng
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…;])\s+|\n+")
+
+
+def split_sentences(text: str) -> list[str]:
+    """Tách câu tiếng Việt, không tách sau các viết tắt (TP. Hồ Chí Minh, PGS. TS. ...)"""
+    sentences, buffer = [], ""
+    for part in _SENTENCE_END_RE.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        buffer = f"{buffer} {part}" if buffer else part
+        last_word = buffer.rsplit(maxsplit=1)[-1].rstrip(".").lower()
+        if buffer.endswith(".") and last_word in VIETNAMESE_ABBREVIATIONS:
+            continue
+        sentences.append(buffer)
+        buffer = ""
+    if buffer:
+        sentences.append(buffer)
+    return sentences
+
+
+def _split_long_sentence(sentence: str, count_tokens, max_tokens: int) -> list[str]:
+    """Câu dài hơn max_tokens: cắt theo từ"""
+    pieces, current = [], []
+    for word in sentence.split():
+        candidate = " ".join(current + [word])
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(" ".join(current))
+            current = [word]
+        else:
+            current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def split_into_windows(text: str, count_tokens, max_tokens: int, overlap_sentences: int = 0) -> list[str]:
+    """
+    Gom các câu liên tiếp thành cửa sổ <= max_tokens
+
+    count_tokens: hàm đếm token theo tokenizer của embedding model
+    overlap_sentences: số câu cuối của cửa sổ trước lặp lại ở đầu cửa sổ sau
+    """
+    sentences = []
+    for sentence in split_sentences(text):
+        if count_tokens(sentence) > max_tokens:
+            sentences.extend(_split_long_sentence(sentence, count_tokens, max_tokens))
+        else:
+            sentences.append(sentence)
+
+    windows, current, current_tokens = [], [], 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence)
+        if current and current_tokens + tokens > max_tokens:
+            windows.append(" ".join(current))
+            current = current[-overlap_sentences:] if overlap_sentences else []
+            current_tokens = sum(count_tokens(s) for s in current)
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        windows.append(" ".join(current))
+
+    return windows or [text]
+
+
+def build_windows(texts: list[str], count_tokens, max_tokens: int, overlap_sentences: int = 0):
+    """
+    Tách nhiều text thành danh sách cửa sổ phẳng để embed trong một batch
+
+    Returns:
+        (windows, owners) - owners[i] là index của text chứa windows[i]
+    """
+    windows, owners = [], []
+    for index, text in enumerate(texts):
+        if count_tokens(text) <= max_tokens:
+            parts = [text]
+        else:
+            parts = split_into_windows(text, count_tokens, max_tokens, overlap_sentences)
+        windows.extend(parts)
+        owners.extend([index] * len(parts))
+    return windows, owners
+
+
+def pool_windows(vectors: np.ndarray, owners: list[int], count: int, method: str = "mean") -> np.ndarray:
+    """Pool các vector cửa sổ về một vector (đã L2 normalize) cho mỗi text"""
+    if method not in POOLING_METHODS:
+        raise ValueError(f"Pooling không hợp lệ: {method} (chọn một trong {POOLING_METHODS})")
+
+    owners_arr = np.asarray(owners)
+    pooled = np.zeros((count, vectors.shape[1]), dtype=np.float32)
+    for index in range(count):
+        group = vectors[owners_arr == index]
+        pooled[index] = group.mean(axis=0) if method == "mean" else group.max(axis=0)
+
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.where(norms > 0, norms, 1.0)
+
+
+def make_token_counter(tokenizer):
+    """Hàm đếm token (không tính special tokens) từ HuggingFace tokenizer của model"""
+    def count_tokens(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return count_tokens
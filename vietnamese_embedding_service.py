@@ -3,19 +3,46 @@
 Vietnamese Embedding Service for LightRAG Server - GPU
 """
 
+import os
+import time
 import torch
 import numpy as np
+from collections import OrderedDict
 from typing import List
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from pydantic import BaseModel
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from sentence_transformers import SentenceTransformer
 import uvicorn
+from vietnamese_chunking import build_windows, pool_windows, make_token_counter, POOLING_METHODS
+from embedding_autotune import autotune, save_result, load_batch_sizes, batch_size_for, device_key
+from embedding_scheduler import EmbeddingScheduler, PRIORITY_CLASSES
 
 MODEL_NAME = "dangvantuan/vietnamese-embedding"
 EMBEDDING_DIM = 768
 MAX_TOKENS = 200  # Giới hạn an toàn cho model (model có max 258)
 HOST = "0.0.0.0"
 PORT = 8001
+# Text dài hơn MAX_TOKENS: "truncate" (cắt bỏ phần đuôi) hoặc "mean" / "max"
+# (tách theo câu thành các cửa sổ <= MAX_TOKENS, embed một batch rồi pool)
+LONG_TEXT_MODE = os.getenv("LONG_TEXT_MODE", "truncate")
+if LONG_TEXT_MODE not in ("truncate", *POOLING_METHODS):
+    raise ValueError(f"LONG_TEXT_MODE không hợp lệ: {LONG_TEXT_MODE} (chọn truncate, {', '.join(POOLING_METHODS)})")
+# Batch size mặc định khi chưa autotune; EMBEDDING_AUTOTUNE=true: tune lúc khởi động nếu chưa có kết quả
+DEFAULT_BATCH_SIZE = 8
+AUTOTUNE_ON_STARTUP = os.getenv("EMBEDDING_AUTOTUNE", "false").lower() == "true"
+
+# Lập lịch ưu tiên: query (interactive) được encode trước chunk ingestion (bulk)
+# Priority: header X-Embedding-Priority > model alias > số lượng text trong request
+INTERACTIVE_MAX_TEXTS = int(os.getenv("INTERACTIVE_MAX_TEXTS", "4"))
+BULK_UNIT_TEXTS = int(os.getenv("BULK_UNIT_TEXTS", "16"))
+MODEL_ALIASES = {
+    "vietnamese-embedding-query": "interactive",
+    "vietnamese-embedding-bulk": "bulk",
+}
+
+# Cache embedding theo text (LRU, số text) - mặc định 0 = tắt
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "0"))
 
 print(f"Loading model: {MODEL_NAME}...")
 device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -24,8 +51,23 @@ print(f"  Device: {device}")
 model = SentenceTransformer(MODEL_NAME, device=device)
 # Không set max_seq_length để tránh xung đột
 
+# Đếm token không tính special tokens ([CLS], [SEP])
+count_tokens = make_token_counter(model.tokenizer)
+WINDOW_TOKENS = MAX_TOKENS - 2
+
 print(f"✓ Model loaded on {device}")
 print(f"  Dimension: {EMBEDDING_DIM}")
+print(f"  Long text mode: {LONG_TEXT_MODE}")
+
+# Batch size theo sequence-length bucket đã tune cho thiết bị này
+DEVICE_KEY = device_key(device)
+tuned_batch_sizes = load_batch_sizes(DEVICE_KEY)
+if not tuned_batch_sizes and AUTOTUNE_ON_STARTUP:
+    print(f"  Autotuning batch size on {DEVICE_KEY}...")
+    autotune_result = autotune(model, device)
+    save_result(autotune_result)
+    tuned_batch_sizes = load_batch_sizes(DEVICE_KEY)
+print(f"  Batch sizes: {tuned_batch_sizes or DEFAULT_BATCH_SIZE}")
 
 app = FastAPI(title="Vietnamese Embedding Service", version="1.4.0")
 
@@ -42,34 +84,163 @@ def truncate_text(text: str) -> str:
         # Fallback
         return text[:MAX_TOKENS*4] if len(text) > MAX_TOKENS*4 else text
 
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Encode theo nhóm độ dài, mỗi nhóm dùng batch size đã tune cho bucket tương ứng"""
+    if not tuned_batch_sizes:
+        return model.encode(
+            texts, batch_size=DEFAULT_BATCH_SIZE, convert_to_numpy=True,
+            normalize_embeddings=True, show_progress_bar=False
+        )
+    
+    groups = {}
+    for i, text in enumerate(texts):
+        batch_size = batch_size_for(tuned_batch_sizes, count_tokens(text), DEFAULT_BATCH_SIZE)
+        groups.setdefault(batch_size, []).append(i)
+    
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for batch_size, indices in groups.items():
+        embeddings[indices] = model.encode(
+            [texts[i] for i in indices], batch_size=batch_size, convert_to_numpy=True,
+            normalize_embeddings=True, show_progress_bar=False
+        )
+    return embeddings
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Truncate hoặc tách cửa sổ + pool, rồi encode (chạy trên worker thread của scheduler)"""
+    if LONG_TEXT_MODE in POOLING_METHODS:
+        # Tách cửa sổ theo câu, encode một batch, pool về một vector / text
+        windows, owners = build_windows(texts, count_tokens, WINDOW_TOKENS)
+        window_embeddings = encode_texts(windows)
+        return pool_windows(window_embeddings, owners, len(texts), LONG_TEXT_MODE)
+    
+    # Truncate
+    truncated = [truncate_text(t) for t in texts]
+    
+    # Encode
+    return encode_texts(truncated)
+
+# ============================================
+# Prometheus metrics (GET /metrics)
+# ============================================
+REQUESTS = Counter("embedding_requests_total", "Embedding requests", ["priority"])
+REQUEST_ERRORS = Counter("embedding_request_errors_total", "Embedding requests failed")
+TEXTS = Counter("embedding_texts_total", "Texts received", ["priority"])
+REQUEST_LATENCY = Histogram(
+    "embedding_request_seconds", "End-to-end request latency", ["priority"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ENCODE_LATENCY = Histogram(
+    "embedding_encode_seconds", "Model encode time per batch", ["priority"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+BATCH_SIZE = Histogram(
+    "embedding_batch_texts", "Texts per encode batch", ["priority"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+CACHE_HITS = Counter("embedding_cache_hits_total", "Embedding cache hits")
+CACHE_MISSES = Counter("embedding_cache_misses_total", "Embedding cache misses")
+CACHE_HIT_RATIO = Gauge("embedding_cache_hit_ratio", "Embedding cache hit ratio since start")
+QUEUE_DEPTH = Gauge("embedding_queue_depth", "Texts waiting in scheduler queue", ["priority"])
+DEVICE_MEMORY = Gauge("embedding_device_memory_bytes", "CUDA memory used by the model", ["kind"])
+
+
+def observe_batch(priority: str, text_count: int, seconds: float):
+    BATCH_SIZE.labels(priority).observe(text_count)
+    ENCODE_LATENCY.labels(priority).observe(seconds)
+
+
+class EmbeddingCache:
+    """LRU cache text -> embedding (query lặp lại, chunk re-insert)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str):
+        if self.max_size <= 0:
+            return None
+        vector = self._data.get(text)
+        if vector is None:
+            self.misses += 1
+            CACHE_MISSES.inc()
+            return None
+        self._data.move_to_end(text)
+        self.hits += 1
+        CACHE_HITS.inc()
+        return vector
+
+    def put(self, text: str, vector: np.ndarray):
+        if self.max_size <= 0:
+            return
+        # Copy: vector là view vào mảng của cả batch, giữ view sẽ giữ cả batch trong RAM
+        self._data[text] = vector.copy()
+        self._data.move_to_end(text)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE)
+scheduler = EmbeddingScheduler(embed_texts, unit_texts=BULK_UNIT_TEXTS, on_batch=observe_batch)
+
+# Gauge được tính tại thời điểm scrape
+CACHE_HIT_RATIO.set_function(embedding_cache.hit_ratio)
+for _priority in PRIORITY_CLASSES:
+    QUEUE_DEPTH.labels(_priority).set_function(lambda p=_priority: scheduler.queue_depth(p))
+if torch.cuda.is_available():
+    DEVICE_MEMORY.labels("allocated").set_function(torch.cuda.memory_allocated)
+    DEVICE_MEMORY.labels("reserved").set_function(torch.cuda.memory_reserved)
+
+def resolve_priority(header_priority: str | None, model_name: str | None, text_count: int) -> str:
+    """Xác định lớp ưu tiên của request"""
+    if header_priority and header_priority.lower() in PRIORITY_CLASSES:
+        return header_priority.lower()
+    if model_name in MODEL_ALIASES:
+        return MODEL_ALIASES[model_name]
+    return "interactive" if text_count <= INTERACTIVE_MAX_TEXTS else "bulk"
+
 @app.get("/v1/models")
 async def list_models():
     return {
         "object": "list",
         "data": [{
-            "id": "vietnamese-embedding",
+            "id": model_id,
             "object": "model",
             "created": 1700000000,
             "owned_by": "local",
             "root": MODEL_NAME,
-        }]
+        } for model_id in ["vietnamese-embedding", *MODEL_ALIASES]]
     }
 
 @app.post("/v1/embeddings")
-async def create_embeddings(request: EmbeddingRequest):
+async def create_embeddings(
+    request: EmbeddingRequest,
+    x_embedding_priority: str | None = Header(default=None),
+):
     try:
         texts = [request.input] if isinstance(request.input, str) else request.input
         if not texts:
             raise HTTPException(status_code=400, detail="Empty input")
         
-        # Truncate
-        truncated = [truncate_text(t) for t in texts]
+        priority = resolve_priority(x_embedding_priority, request.model, len(texts))
+        REQUESTS.labels(priority).inc()
+        TEXTS.labels(priority).inc(len(texts))
+        start = time.perf_counter()
         
-        # Encode
-        embeddings = model.encode(
-            truncated, batch_size=8, convert_to_numpy=True,
-            normalize_embeddings=True, show_progress_bar=False
-        )
+        # Chỉ encode các text chưa có trong cache
+        embeddings = [embedding_cache.get(t) for t in texts]
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            computed = await scheduler.submit([texts[i] for i in missing], priority)
+            for i, emb in zip(missing, computed):
+                embeddings[i] = emb
+                embedding_cache.put(texts[i], emb)
+        REQUEST_LATENCY.labels(priority).observe(time.perf_counter() - start)
         
         data = [{"object": "embedding", "index": i, "embedding": emb.tolist()} 
                 for i, emb in enumerate(embeddings)]
@@ -81,6 +252,7 @@ async def create_embeddings(request: EmbeddingRequest):
             "usage": {"prompt_tokens": sum(len(t.split()) for t in texts), "total_tokens": sum(len(t.split()) for t in texts)}
         }
     except Exception as e:
+        REQUEST_ERRORS.inc()
         print(f"[ERROR] {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -92,9 +264,39 @@ async def health_check():
         "dimensions": EMBEDDING_DIM,
         "device": device,
         "max_tokens": MAX_TOKENS,
-        "gpu": torch.cuda.is_available()
+        "long_text_mode": LONG_TEXT_MODE,
+        "gpu": torch.cuda.is_available(),
+        "batch_sizes": tuned_batch_sizes or DEFAULT_BATCH_SIZE,
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition format"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/admin/scheduler")
+async def scheduler_stats():
+    """Latency / queue wait theo lớp ưu tiên và độ sâu hàng đợi"""
+    return scheduler.report()
+
+@app.get("/admin/autotune")
+async def get_autotune():
+    return {"device": DEVICE_KEY, "batch_sizes": tuned_batch_sizes, "default_batch_size": DEFAULT_BATCH_SIZE}
+
+@app.post("/admin/autotune")
+async def run_autotune():
+    """
+    Quét lại batch size trên thiết bị hiện tại, lưu kết quả và trả về đường cong throughput/memory
+
+    Chạy trên worker thread của scheduler: request embedding chờ tới khi autotune xong
+    (batch live làm sai số đo throughput / peak memory và tranh bộ nhớ GPU)
+    """
+    global tuned_batch_sizes
+    result = await scheduler.run_exclusive(autotune, model, device)
+    save_result(result)
+    tuned_batch_sizes = load_batch_sizes(DEVICE_KEY)
+    return result
+
 if __name__ == "__main__":
     print(f"\nStarting server on http://{HOST}:{PORT}")
     uvicorn.run(app, host=HOST, port=PORT)